@@ -1,13 +1,22 @@
 import os
 import requests
-from flask import Flask, jsonify, send_file, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
 import json
+import re
+import tempfile
 import time
+import base64
 import hashlib
-from PIL import Image, ImageOps
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from PIL import Image, ImageOps, features
 from io import BytesIO
 import exifread  # ADICIONE ESTE IMPORT
+from metricas import Registro, medir_etapa, registrar_evento
+from duplicatas import agrupar_duplicatas, calcular_dhash
 
 app = Flask(__name__, static_folder='.', static_url_path='')
 CORS(app)
@@ -15,17 +24,183 @@ CORS(app)
 # Configurações
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CACHE_FILE = os.path.join(BASE_DIR, 'fotos_cache.json')
+RESUMO_FILE = os.path.join(BASE_DIR, 'fotos_cache_resumo.json')
 THUMBNAIL_FOLDER = os.path.join(BASE_DIR, 'thumbnails')
+DISPLAY_FOLDER = os.path.join(BASE_DIR, 'fotos_display')
 os.makedirs(THUMBNAIL_FOLDER, exist_ok=True)
+os.makedirs(DISPLAY_FOLDER, exist_ok=True)
 
 # Configuração do GitHub
 GITHUB_REPO = "gbrow/fotos-mapa"
 GITHUB_BRANCH = "main"
 GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN', '')
+# Endereços da API e dos arquivos raw (trocados pelo benchmark.py por um servidor local)
+GITHUB_API_BASE = os.environ.get('GITHUB_API_BASE', 'https://api.github.com')
+GITHUB_RAW_BASE = os.environ.get('GITHUB_RAW_BASE', 'https://raw.githubusercontent.com')
 
 # Tamanho da thumbnail
 THUMBNAIL_SIZE = (300, 300)
 
+# Versão "display" servida em /foto/<id> (gerada no primeiro acesso) e
+# placeholder minúsculo (LQIP) embutido no registro da foto
+DISPLAY_SIZE = (1600, 1600)
+PLACEHOLDER_SIZE = (16, 16)
+
+# Quase duplicatas (rajadas): diferença máxima em bits do dHash e janela
+# de tempo/distância em que duas fotos parecidas viram uma só
+DUPLICATA_MAX_BITS = int(os.environ.get('DUPLICATA_MAX_BITS', '10'))
+DUPLICATA_JANELA_SEGUNDOS = float(os.environ.get('DUPLICATA_JANELA_SEGUNDOS', '120'))
+DUPLICATA_RAIO_METROS = float(os.environ.get('DUPLICATA_RAIO_METROS', '50'))
+
+# Limites de memória na decodificação: bytes por arquivo baixado, pixels por
+# imagem (Pillow recusa acima disso), quanto de cada download fica em memória
+# antes de ir para disco e orçamento global de memória das decodificações
+MAX_BYTES_IMAGEM = int(os.environ.get('MAX_BYTES_IMAGEM', str(60 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', '120000000'))
+SPOOL_MAX_MEMORIA = 2 * 1024 * 1024
+ORCAMENTO_DECODIFICACAO = int(os.environ.get('ORCAMENTO_DECODIFICACAO_MB', '128')) * 1024 * 1024
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Geotag por trajeto: fuso horário do relógio da câmera (horas em relação a UTC,
+# usado quando o EXIF não traz OffsetTimeOriginal) e maior intervalo (segundos)
+# entre pontos do trajeto aceito para interpolar
+FUSO_HORARIO_CAMERA = float(os.environ.get('FUSO_HORARIO_CAMERA', '-3'))
+MAX_INTERVALO_INTERPOLACAO = float(os.environ.get('MAX_INTERVALO_INTERPOLACAO', '600'))
+
+# Pontos desenhados por trajeto de gx:Track/GPX (a geotag usa todos os pontos)
+MAX_PONTOS_DESENHO = int(os.environ.get('MAX_PONTOS_DESENHO', '2000'))
+
+# Tempo (segundos) depois do qual um processamento que não terminou é dado como
+# interrompido em /api/status
+MAX_DURACAO_ATUALIZACAO = float(os.environ.get('MAX_DURACAO_ATUALIZACAO', '1800'))
+
+# Métricas (expostas em /metrics)
+metricas = Registro()
+LATENCIA_REQUISICOES = metricas.histograma('mapa_fotos_requisicao_duracao_segundos', 'Latência das requisições por rota')
+REQUISICOES = metricas.contador('mapa_fotos_requisicoes_total', 'Requisições por rota e status HTTP')
+CACHE_CONSULTAS = metricas.contador('mapa_fotos_cache_consultas_total', 'Consultas ao cache por resultado (hit/miss)')
+CACHE_RECARGAS = metricas.contador('mapa_fotos_cache_recargas_total', 'Leituras do fotos_cache.json no disco')
+PROCESSAMENTOS = metricas.contador('mapa_fotos_processamentos_total', 'Execuções de processar_arquivos')
+DURACAO_ETAPAS = metricas.histograma('mapa_fotos_etapa_duracao_segundos', 'Duração das etapas de ingestão')
+BYTES_BAIXADOS = metricas.contador('mapa_fotos_bytes_baixados_total', 'Bytes baixados do GitHub por tipo de arquivo')
+GITHUB_RATE_LIMIT = metricas.medidor('mapa_fotos_github_rate_limit_restante', 'Requisições restantes na API do GitHub')
+THUMBNAILS_ARQUIVOS = metricas.medidor('mapa_fotos_thumbnails_arquivos', 'Quantidade de thumbnails em disco')
+THUMBNAILS_BYTES = metricas.medidor('mapa_fotos_thumbnails_bytes', 'Tamanho total das thumbnails em disco')
+DECODIFICACAO_BYTES = metricas.medidor('mapa_fotos_decodificacao_bytes', 'Memória reservada pelas decodificações em andamento')
+ARQUIVOS_RECUSADOS = metricas.contador('mapa_fotos_arquivos_recusados_total', 'Arquivos recusados por tamanho ou pixels')
+
+class ArquivoGrandeDemais(Exception):
+    """Download passou de MAX_BYTES_IMAGEM"""
+
+class OrcamentoMemoria:
+    """Limita a memória somada das decodificações simultâneas
+    
+    Cada decodificação reserva uma estimativa em bytes e espera enquanto o
+    total passar do limite. Uma reserva maior que o limite inteiro roda
+    sozinha, para não travar para sempre.
+    """
+    
+    def __init__(self, limite):
+        self.limite = limite
+        self.em_uso = 0
+        self.condicao = threading.Condition()
+    
+    def reservar(self, quantidade):
+        return ReservaMemoria(self, quantidade)
+
+class ReservaMemoria:
+    def __init__(self, orcamento, quantidade):
+        self.orcamento = orcamento
+        self.quantidade = quantidade
+    
+    def __enter__(self):
+        orcamento = self.orcamento
+        with orcamento.condicao:
+            orcamento.condicao.wait_for(
+                lambda: orcamento.em_uso == 0 or orcamento.em_uso + self.quantidade <= orcamento.limite)
+            orcamento.em_uso += self.quantidade
+            DECODIFICACAO_BYTES.set(orcamento.em_uso)
+        return self
+    
+    def __exit__(self, *exc):
+        orcamento = self.orcamento
+        with orcamento.condicao:
+            orcamento.em_uso -= self.quantidade
+            DECODIFICACAO_BYTES.set(orcamento.em_uso)
+            orcamento.condicao.notify_all()
+        return False
+
+orcamento_decodificacao = OrcamentoMemoria(ORCAMENTO_DECODIFICACAO)
+
+def medir_thumbnails():
+    """Inicializa os medidores de thumbnails varrendo o diretório uma vez"""
+    quantidade = 0
+    total = 0
+    for entrada in os.scandir(THUMBNAIL_FOLDER):
+        if entrada.is_file():
+            quantidade += 1
+            total += entrada.stat().st_size
+    THUMBNAILS_ARQUIVOS.set(quantidade)
+    THUMBNAILS_BYTES.set(total)
+
+medir_thumbnails()
+
+# Resumo do cache, atualizado na escrita e lido por /api/status sem abrir o
+# cache completo. Fica também em disco para ser visto pelos outros workers.
+INICIO_PROCESSO = time.time()
+resumo_cache = {
+    'geracao': 0,
+    'processed_at': None,
+    'fotos': 0,
+    'trajetos': 0,
+    'total_files': 0,
+    'thumbnails': 0,
+    'ultima_duracao_segundos': None,
+    'ultimo_erro': None,
+    'ultimo_erro_em': None,
+    'atualizando': False,
+    'atualizacao_iniciada_em': None
+}
+resumo_mtime = None
+
+def carregar_resumo_cache():
+    """Retorna o resumo do cache, relendo o arquivo só se outro processo o alterou"""
+    global resumo_mtime
+    try:
+        mtime = os.stat(RESUMO_FILE).st_mtime_ns
+    except FileNotFoundError:
+        if resumo_mtime is None and os.path.exists(CACHE_FILE):
+            # Cache antigo, anterior ao resumo: gerar o resumo uma única vez
+            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            atualizar_resumo_cache(
+                processed_at=data.get('processed_at', os.path.getmtime(CACHE_FILE)),
+                fotos=len(data.get('fotos', [])),
+                trajetos=len(data.get('trajetos', [])),
+                total_files=data.get('total_files', 0),
+                thumbnails=THUMBNAILS_ARQUIVOS.valor()
+            )
+        return resumo_cache
+    
+    if mtime != resumo_mtime:
+        try:
+            with open(RESUMO_FILE, 'r', encoding='utf-8') as f:
+                resumo_cache.update(json.load(f))
+            resumo_mtime = mtime
+        except ValueError:
+            pass
+    return resumo_cache
+
+def atualizar_resumo_cache(**campos):
+    """Atualiza o resumo em memória e grava no disco (troca atômica)"""
+    global resumo_mtime
+    resumo_cache.update(campos)
+    temporario = f'{RESUMO_FILE}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(resumo_cache, f, ensure_ascii=False)
+    os.replace(temporario, RESUMO_FILE)
+    resumo_mtime = os.stat(RESUMO_FILE).st_mtime_ns
+
 def get_github_headers():
     """Headers para requests do GitHub"""
     headers = {
@@ -38,22 +213,28 @@ def get_github_headers():
 
 def get_github_raw_url(filename):
     """Gera URL raw do GitHub para um arquivo"""
-    return f"https://raw.githubusercontent.com/{GITHUB_REPO}/{GITHUB_BRANCH}/{filename}"
+    return f"{GITHUB_RAW_BASE}/{GITHUB_REPO}/{GITHUB_BRANCH}/{filename}"
 
 def get_github_api_url(path=""):
     """Gera URL da API do GitHub"""
-    return f"https://api.github.com/repos/{GITHUB_REPO}/contents/{path}"
+    return f"{GITHUB_API_BASE}/repos/{GITHUB_REPO}/contents/{path}"
 
 def listar_arquivos_github():
     """Lista arquivos do repositório GitHub"""
     try:
         print(f"🔍 Conectando ao GitHub: {GITHUB_REPO}")
         
-        response = requests.get(
-            get_github_api_url(),
-            headers=get_github_headers(),
-            timeout=30
-        )
+        with medir_etapa(DURACAO_ETAPAS, 'listagem', repo=GITHUB_REPO):
+            response = requests.get(
+                get_github_api_url(),
+                headers=get_github_headers(),
+                timeout=30
+            )
+            BYTES_BAIXADOS.inc(len(response.content), tipo='api')
+        
+        restante = response.headers.get('X-RateLimit-Remaining')
+        if restante is not None:
+            GITHUB_RATE_LIMIT.set(int(restante))
         
         print(f"📡 Status GitHub: {response.status_code}")
         
@@ -120,93 +301,258 @@ def extrair_coordenadas_exif(image_data):
         return None, None
 
 def extrair_data_exif(image_data):
-    """Extrai data dos metadados EXIF"""
+    """Extrai data dos metadados EXIF
+    
+    Retorna (data, fuso): o fuso ('-03:00') vem da tag OffsetTime* que
+    acompanha o campo de data encontrado, ou None se a câmera não gravou.
+    """
     try:
         tags = exifread.process_file(image_data, details=False)
         
-        # Tentar vários campos de data
+        # Tentar vários campos de data (com a tag de fuso correspondente)
         date_fields = [
-            'EXIF DateTimeOriginal',
-            'Image DateTime',
-            'EXIF DateTimeDigitized',
-            'EXIF SubSecTimeOriginal'
+            ('EXIF DateTimeOriginal', 'EXIF OffsetTimeOriginal'),
+            ('Image DateTime', 'EXIF OffsetTime'),
+            ('EXIF DateTimeDigitized', 'EXIF OffsetTimeDigitized'),
+            ('EXIF SubSecTimeOriginal', None)
         ]
         
-        for field in date_fields:
+        for field, offset_field in date_fields:
             if field in tags:
-                return str(tags[field])
+                fuso = str(tags[offset_field]).strip() if offset_field in tags else None
+                return str(tags[field]), fuso or None
         
-        return None
+        return None, None
     except:
+        return None, None
+
+def converter_data_exif(data_tirada, fuso_exif=None):
+    """Converte data EXIF ('AAAA:MM:DD HH:MM:SS', hora local da câmera) em epoch UTC
+    
+    Usa o fuso do EXIF ('+HH:MM'/'-HH:MM') quando houver; senão, FUSO_HORARIO_CAMERA.
+    """
+    if not data_tirada:
         return None
+    try:
+        data = datetime.strptime(str(data_tirada).strip()[:19], '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+    
+    fuso = timezone(timedelta(hours=FUSO_HORARIO_CAMERA))
+    offset = re.fullmatch(r'([+-])(\d{2}):?(\d{2})', fuso_exif or '')
+    if offset:
+        minutos = int(offset.group(2)) * 60 + int(offset.group(3))
+        if minutos < 24 * 60:
+            fuso = timezone(timedelta(minutes=-minutos if offset.group(1) == '-' else minutos))
+    return data.replace(tzinfo=fuso).timestamp()
 
-def processar_imagem_com_exif(url, filename):
-    """Processa imagem extraindo coordenadas EXIF reais"""
+def converter_data_iso(texto):
+    """Converte data ISO 8601 de KML/GPX (ex: 2025-12-16T13:52:55Z) em epoch UTC"""
     try:
-        print(f"📥 Processando: {filename}")
-        
-        # Baixar imagem
-        response = requests.get(url, timeout=30, stream=True)
-        if response.status_code != 200:
-            print(f"  ❌ Erro ao baixar: {response.status_code}")
-            return None
+        texto = texto.strip().replace('Z', '+00:00')
+        # Python 3.10 só aceita frações com 3 ou 6 dígitos
+        texto = re.sub(r'(\.\d+)', lambda m: m.group(1)[:7].ljust(7, '0'), texto, count=1)
+        data = datetime.fromisoformat(texto)
+        if data.tzinfo is None:
+            data = data.replace(tzinfo=timezone.utc)
+        return data.timestamp()
+    except ValueError:
+        return None
+
+def abrir_imagem_reduzida(arquivo, tamanho):
+    """Abre a imagem (só o cabeçalho) preparando a decodificação reduzida
+    
+    Recusa imagens acima de MAX_IMAGE_PIXELS. Em JPEG, draft() faz o
+    decodificador escalar no domínio DCT (1/2, 1/4 ou 1/8) para a menor
+    resolução que ainda cobre `tamanho`, sem montar a imagem inteira.
+    """
+    img = Image.open(arquivo)
+    largura, altura = img.size
+    if largura * altura > MAX_IMAGE_PIXELS:
+        ARQUIVOS_RECUSADOS.inc(motivo='pixels')
+        raise Image.DecompressionBombError(
+            f'Imagem com {largura}x{altura} pixels passa do limite de {MAX_IMAGE_PIXELS}')
+    img.draft(img.mode, tamanho)
+    return img
+
+def estimar_memoria(img):
+    """Memória aproximada para decodificar `img` (já reduzida pelo draft) e transformá-la"""
+    largura, altura = img.size
+    # 4 bytes por pixel na decodificação + uma cópia na rotação do EXIF
+    return largura * altura * 4 * 2
+
+def gerar_thumbnail(img_bytes, thumb_path):
+    """Gera a thumbnail JPEG de uma imagem (arquivo) e retorna a imagem reduzida"""
+    img_bytes.seek(0)
+    img = abrir_imagem_reduzida(img_bytes, THUMBNAIL_SIZE)
+    
+    with orcamento_decodificacao.reservar(estimar_memoria(img)):
+        # Corrigir orientação EXIF
+        img = ImageOps.exif_transpose(img)
         
-        # Ler imagem em memória
-        img_bytes = BytesIO(response.content)
+        # Redimensionar
+        img.thumbnail(THUMBNAIL_SIZE)
         
-        # Extrair EXIF (precisa ler como bytes)
-        img_bytes.seek(0)
-        latitude, longitude = extrair_coordenadas_exif(img_bytes)
+        # Converter formato se necessário
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGB')
         
-        # Extrair data
-        img_bytes.seek(0)
-        data_tirada = extrair_data_exif(img_bytes)
+        # Salvar thumbnail
+        img.save(thumb_path, 'JPEG', quality=85, optimize=True)
+    return img
+
+def gerar_placeholder(thumb):
+    """Gera o placeholder (LQIP) da foto a partir da thumbnail, como data URI
+    
+    WebP fica com poucas dezenas de bytes; JPEG (fallback) carrega ~300 bytes
+    só de cabeçalho.
+    """
+    formato = 'webp' if features.check('webp') else 'jpeg'
+    img = thumb.convert('RGB')
+    img.thumbnail(PLACEHOLDER_SIZE)
+    buffer = BytesIO()
+    img.save(buffer, formato.upper(), quality=30)
+    return f'data:image/{formato};base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def baixar_para_temporario(url, filename, tipo, limite_bytes=None):
+    """Baixa em streaming para um SpooledTemporaryFile (memória até 2 MB, depois disco)
+    
+    Retorna o arquivo posicionado no início, ou None se o download falhar.
+    Levanta ArquivoGrandeDemais se passar de `limite_bytes` (padrão:
+    MAX_BYTES_IMAGEM).
+    """
+    if limite_bytes is None:
+        limite_bytes = MAX_BYTES_IMAGEM
+    with medir_etapa(DURACAO_ETAPAS, 'download', arquivo=filename, tipo=tipo):
+        response = requests.get(url, timeout=30, stream=True)
+        try:
+            if response.status_code != 200:
+                print(f"  ❌ Erro ao baixar: {response.status_code}")
+                return None
+            
+            tamanho = int(response.headers.get('Content-Length') or 0)
+            if tamanho > limite_bytes:
+                ARQUIVOS_RECUSADOS.inc(motivo='bytes')
+                raise ArquivoGrandeDemais(f'{filename}: {tamanho} bytes (limite {limite_bytes})')
+            
+            destino = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORIA)
+            try:
+                total = 0
+                for bloco in response.iter_content(64 * 1024):
+                    total += len(bloco)
+                    if total > limite_bytes:
+                        ARQUIVOS_RECUSADOS.inc(motivo='bytes')
+                        raise ArquivoGrandeDemais(f'{filename}: mais de {limite_bytes} bytes')
+                    destino.write(bloco)
+            except BaseException:
+                destino.close()
+                raise
+            
+            BYTES_BAIXADOS.inc(total, tipo=tipo)
+            destino.seek(0)
+            return destino
+        finally:
+            response.close()
+
+def baixar_arquivo(url, filename, tipo, **kwargs):
+    """Baixa um arquivo do GitHub medindo duração e bytes recebidos"""
+    with medir_etapa(DURACAO_ETAPAS, 'download', arquivo=filename, tipo=tipo):
+        response = requests.get(url, timeout=30, **kwargs)
+        if response.status_code == 200:
+            BYTES_BAIXADOS.inc(len(response.content), tipo=tipo)
+    return response
+
+def processar_imagem_com_exif(url, filename, indice_trajeto=None):
+    """Processa imagem extraindo coordenadas EXIF reais
+    
+    Fotos sem GPS são posicionadas pelo horário em `indice_trajeto`
+    (montar_indice_temporal); sem trajeto que as cubra, são descartadas
+    antes de gerar thumbnail.
+    """
+    img_bytes = None
+    try:
+        print(f"📥 Processando: {filename}")
         
-        # Se não tem coordenadas GPS, pular esta imagem
-        if latitude is None or longitude is None:
-            print(f"  ⚠️  Sem coordenadas GPS: {filename}")
+        # Baixar imagem (em memória se pequena, senão em arquivo temporário)
+        try:
+            img_bytes = baixar_para_temporario(url, filename, 'imagem')
+        except ArquivoGrandeDemais as e:
+            print(f"  ⚠️  Arquivo grande demais: {e}")
+            return None
+        if img_bytes is None:
             return None
         
-        print(f"  📍 Coordenadas encontradas: {latitude:.6f}, {longitude:.6f}")
+        with medir_etapa(DURACAO_ETAPAS, 'exif', arquivo=filename):
+            # Extrair EXIF (precisa ler como bytes)
+            img_bytes.seek(0)
+            latitude, longitude = extrair_coordenadas_exif(img_bytes)
+            
+            # Extrair data
+            img_bytes.seek(0)
+            data_tirada, fuso_exif = extrair_data_exif(img_bytes)
         
-        # Gerar thumbnail
-        img_bytes.seek(0)
+        # Sem coordenadas GPS: só segue se algum trajeto cobrir o horário
+        timestamp = converter_data_exif(data_tirada, fuso_exif)
+        posicao_interpolada = False
+        if latitude is None or longitude is None:
+            if timestamp is None:
+                print(f"  ⚠️  Sem coordenadas GPS nem data: {filename}")
+                return None
+            posicao = posicionar_por_trajeto(indice_trajeto, timestamp)
+            if posicao is None:
+                print(f"  ⚠️  Sem GPS nem ponto de trajeto no horário: {filename}")
+                return None
+            latitude, longitude = posicao
+            posicao_interpolada = True
+            print(f"  🕒 Posição interpolada pelo trajeto: {latitude:.6f}, {longitude:.6f}")
+        else:
+            print(f"  📍 Coordenadas encontradas: {latitude:.6f}, {longitude:.6f}")
+        
+        # Gerar thumbnail (o hash também é o id da foto em /foto/<id>)
         thumb_hash = hashlib.md5(url.encode()).hexdigest()[:12]
         thumb_name = f"{thumb_hash}.jpg"
         thumb_path = os.path.join(THUMBNAIL_FOLDER, thumb_name)
         
         # Criar thumbnail se não existir
+        thumb = None
         if not os.path.exists(thumb_path):
             try:
-                img_bytes.seek(0)
-                img = Image.open(img_bytes)
-                
-                # Corrigir orientação EXIF
-                img = ImageOps.exif_transpose(img)
-                
-                # Redimensionar
-                img.thumbnail(THUMBNAIL_SIZE)
-                
-                # Converter formato se necessário
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Salvar thumbnail
-                img.save(thumb_path, 'JPEG', quality=85, optimize=True)
+                with medir_etapa(DURACAO_ETAPAS, 'thumbnail', arquivo=filename):
+                    thumb = gerar_thumbnail(img_bytes, thumb_path)
+                THUMBNAILS_ARQUIVOS.inc()
+                THUMBNAILS_BYTES.inc(os.path.getsize(thumb_path))
                 print(f"  ✅ Thumbnail criada")
                 
             except Exception as e:
                 print(f"  ⚠️  Erro ao criar thumbnail: {e}")
                 thumb_name = None
         
+        # Placeholder e hash perceptual saem da thumbnail, já pequena
+        placeholder = None
+        dhash = None
+        if thumb_name:
+            try:
+                if thumb is None:
+                    with Image.open(thumb_path) as arquivo_thumb:
+                        thumb = arquivo_thumb.convert('RGB')
+                placeholder = gerar_placeholder(thumb)
+                dhash = f'{calcular_dhash(thumb):016x}'
+            except Exception as e:
+                print(f"  ⚠️  Erro ao criar placeholder/hash: {e}")
+        
         return {
+            'id': thumb_hash,
             'filename': filename,
             'original_url': url,
             'thumbnail': f'/thumbnail/{thumb_name}' if thumb_name else None,
-            'full_image': url,
+            'full_image': f'/foto/{thumb_hash}',
+            'placeholder': placeholder,
+            'dhash': dhash,
             'latitude': float(latitude),
             'longitude': float(longitude),
             'data_tirada': data_tirada or 'Data não disponível',
+            'timestamp': timestamp,
+            'posicao_interpolada': posicao_interpolada,
             'processed_at': time.time()
         }
         
@@ -215,99 +561,306 @@ def processar_imagem_com_exif(url, filename):
         import traceback
         traceback.print_exc()
         return None
+    
+    finally:
+        if img_bytes is not None:
+            img_bytes.close()
 
-def processar_kml_simples(kml_url, filename):
-    """Processa KML de forma simplificada"""
+def extrair_pontos_gx_track(conteudo):
+    """Extrai pontos (epoch, lat, lon) dos pares <when>/<gx:coord> de um gx:Track"""
+    pontos = []
+    for track in re.findall(r'<gx:Track[^>]*>(.*?)</gx:Track>', conteudo, re.DOTALL):
+        whens = re.findall(r'<when>([^<]+)</when>', track)
+        coords = re.findall(r'<gx:coord>([^<]+)</gx:coord>', track)
+        
+        for when, coord in zip(whens, coords):
+            parts = coord.split()
+            if len(parts) < 2:
+                continue
+            timestamp = converter_data_iso(when)
+            if timestamp is None:
+                continue
+            try:
+                # gx:coord: longitude latitude altitude (separados por espaço)
+                pontos.append((timestamp, float(parts[1]), float(parts[0])))
+            except ValueError:
+                continue
+    return pontos
+
+def processar_kml_simples(kml_url, filename, pontos_tempo=None):
+    """Processa KML de forma simplificada
+    
+    Se `pontos_tempo` for uma lista, recebe os pontos com horário (gx:Track)
+    usados para geotag das fotos sem GPS.
+    """
     try:
         print(f"🗺️ Processando KML: {filename}")
         
-        response = requests.get(kml_url, timeout=30)
+        response = baixar_arquivo(kml_url, filename, 'kml')
         if response.status_code != 200:
             return []
         
         content = response.text
         
-        # Extrair coordenadas de forma simples
-        import re
+        with medir_etapa(DURACAO_ETAPAS, 'kml', arquivo=filename):
+            return extrair_trajetos_kml(content, filename, pontos_tempo)
+        
+    except Exception as e:
+        print(f"❌ Erro ao processar KML {filename}: {e}")
+        return []
+
+def reduzir_pontos(coordenadas, maximo=None):
+    """Reduz a linha desenhada a no máximo `maximo` pontos (padrão: MAX_PONTOS_DESENHO)
+    
+    Mantém um ponto a cada N, sempre com o primeiro e o último. Serve só ao
+    desenho no mapa; a geotag continua com os pontos completos.
+    """
+    if maximo is None:
+        maximo = MAX_PONTOS_DESENHO
+    if maximo < 2 or len(coordenadas) <= maximo:
+        return coordenadas
+    passo = -(-(len(coordenadas) - 1) // (maximo - 1))
+    reduzidas = coordenadas[::passo]
+    if reduzidas[-1] is not coordenadas[-1]:
+        reduzidas.append(coordenadas[-1])
+    return reduzidas
+
+def extrair_trajetos_kml(content, filename, pontos_tempo=None):
+    """Extrai os trajetos (Placemarks) do conteúdo de um KML"""
+    trajetos = []
+    
+    # Buscar por Placemarks
+    placemark_pattern = r'<Placemark>.*?</Placemark>'
+    placemarks = re.findall(placemark_pattern, content, re.DOTALL)
+    
+    for placemark in placemarks:
+        # Extrair nome
+        name_match = re.search(r'<name>([^<]+)</name>', placemark)
+        name = name_match.group(1) if name_match else filename
         
-        trajetos = []
+        # Extrair descrição
+        desc_match = re.search(r'<description>([^<]+)</description>', placemark)
+        description = desc_match.group(1) if desc_match else ''
         
-        # Buscar por Placemarks
-        placemark_pattern = r'<Placemark>.*?</Placemark>'
-        placemarks = re.findall(placemark_pattern, content, re.DOTALL)
+        # Extrair pontos com horário (gx:Track)
+        pontos = extrair_pontos_gx_track(placemark)
+        if pontos_tempo is not None:
+            pontos_tempo.extend(pontos)
         
-        for placemark in placemarks:
-            # Extrair nome
-            name_match = re.search(r'<name>([^<]+)</name>', placemark)
-            name = name_match.group(1) if name_match else filename
+        # Extrair coordenadas
+        coordenadas = []
+        coords_match = re.search(r'<coordinates>([^<]+)</coordinates>', placemark, re.DOTALL)
+        if coords_match:
+            coords_text = coords_match.group(1).strip()
             
-            # Extrair descrição
-            desc_match = re.search(r'<description>([^<]+)</description>', placemark)
-            description = desc_match.group(1) if desc_match else ''
-            
-            # Extrair coordenadas
-            coords_match = re.search(r'<coordinates>([^<]+)</coordinates>', placemark, re.DOTALL)
-            if coords_match:
-                coordenadas = []
-                coords_text = coords_match.group(1).strip()
-                
-                # Processar coordenadas
-                for line in coords_text.split('\n'):
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    for coord in line.split():
-                        parts = coord.split(',')
-                        if len(parts) >= 2:
-                            try:
-                                # KML: longitude, latitude, altitude
-                                lon = float(parts[0])
-                                lat = float(parts[1])
-                                coordenadas.append([lat, lon])  # Leaflet: lat, lon
-                            except ValueError:
-                                continue
+            # Processar coordenadas
+            for line in coords_text.split('\n'):
+                line = line.strip()
+                if not line:
+                    continue
                 
-                if len(coordenadas) > 1:
-                    trajetos.append({
-                        'type': 'LineString',
-                        'name': name,
-                        'description': description,
-                        'filename': filename,
-                        'coordinates': coordenadas,
-                        'color': '#FF0000',
-                        'weight': 3,
-                        'opacity': 0.7
-                    })
-                    print(f"  ✅ Trajeto '{name}' com {len(coordenadas)} pontos")
-        
-        return trajetos
+                for coord in line.split():
+                    parts = coord.split(',')
+                    if len(parts) >= 2:
+                        try:
+                            # KML: longitude, latitude, altitude
+                            lon = float(parts[0])
+                            lat = float(parts[1])
+                            coordenadas.append([lat, lon])  # Leaflet: lat, lon
+                        except ValueError:
+                            continue
+        elif pontos:
+            # Sem <coordinates>: desenhar o próprio gx:Track (reduzido)
+            coordenadas = reduzir_pontos([[lat, lon] for _, lat, lon in pontos])
+        
+        if len(coordenadas) > 1:
+            trajetos.append({
+                'type': 'LineString',
+                'name': name,
+                'description': description,
+                'filename': filename,
+                'coordinates': coordenadas,
+                'color': '#FF0000',
+                'weight': 3,
+                'opacity': 0.7
+            })
+            print(f"  ✅ Trajeto '{name}' com {len(coordenadas)} pontos")
+    
+    return trajetos
+
+def processar_gpx_simples(gpx_url, filename, pontos_tempo=None):
+    """Processa GPX de forma simplificada (trk/trkseg/trkpt)"""
+    try:
+        print(f"🗺️ Processando GPX: {filename}")
+        
+        response = baixar_arquivo(gpx_url, filename, 'gpx')
+        if response.status_code != 200:
+            return []
+        
+        content = response.text
+        
+        with medir_etapa(DURACAO_ETAPAS, 'gpx', arquivo=filename):
+            return extrair_trajetos_gpx(content, filename, pontos_tempo)
         
     except Exception as e:
-        print(f"❌ Erro ao processar KML {filename}: {e}")
+        print(f"❌ Erro ao processar GPX {filename}: {e}")
         return []
 
+def extrair_trajetos_gpx(content, filename, pontos_tempo=None):
+    """Extrai os trajetos (trk) do conteúdo de um GPX"""
+    trajetos = []
+    
+    for trk in re.findall(r'<trk>(.*?)</trk>', content, re.DOTALL):
+        name_match = re.search(r'<name>([^<]+)</name>', trk)
+        name = name_match.group(1) if name_match else filename
+        
+        coordenadas = []
+        for attrs, corpo in re.findall(r'<trkpt\s([^>]*?)(?:/>|>(.*?)</trkpt>)', trk, re.DOTALL):
+            lat_match = re.search(r'lat="([^"]+)"', attrs)
+            lon_match = re.search(r'lon="([^"]+)"', attrs)
+            if not lat_match or not lon_match:
+                continue
+            try:
+                lat = float(lat_match.group(1))
+                lon = float(lon_match.group(1))
+            except ValueError:
+                continue
+            coordenadas.append([lat, lon])
+            
+            time_match = re.search(r'<time>([^<]+)</time>', corpo)
+            if pontos_tempo is not None and time_match:
+                timestamp = converter_data_iso(time_match.group(1))
+                if timestamp is not None:
+                    pontos_tempo.append((timestamp, lat, lon))
+        
+        coordenadas = reduzir_pontos(coordenadas)
+        if len(coordenadas) > 1:
+            trajetos.append({
+                'type': 'LineString',
+                'name': name,
+                'description': '',
+                'filename': filename,
+                'coordinates': coordenadas,
+                'color': '#FF0000',
+                'weight': 3,
+                'opacity': 0.7
+            })
+            print(f"  ✅ Trajeto '{name}' com {len(coordenadas)} pontos")
+    
+    return trajetos
+
+def montar_indice_temporal(pontos_tempo):
+    """Ordena os pontos (epoch, lat, lon) e separa em arrays para busca binária"""
+    pontos_tempo.sort(key=lambda ponto: ponto[0])
+    tempos = [ponto[0] for ponto in pontos_tempo]
+    posicoes = [(ponto[1], ponto[2]) for ponto in pontos_tempo]
+    return tempos, posicoes
+
+def interpolar_posicao(tempos, posicoes, timestamp):
+    """Interpola (lat, lon) no instante `timestamp` por busca binária no trajeto
+    
+    Retorna None fora do intervalo do trajeto ou em buracos maiores que
+    MAX_INTERVALO_INTERPOLACAO (ex: GPS desligado).
+    """
+    i = bisect_left(tempos, timestamp)
+    if i < len(tempos) and tempos[i] == timestamp:
+        return posicoes[i]
+    if i == 0 or i == len(tempos):
+        return None
+    
+    t0, t1 = tempos[i - 1], tempos[i]
+    if t1 - t0 > MAX_INTERVALO_INTERPOLACAO:
+        return None
+    
+    fracao = (timestamp - t0) / (t1 - t0)
+    lat0, lon0 = posicoes[i - 1]
+    lat1, lon1 = posicoes[i]
+    return lat0 + (lat1 - lat0) * fracao, lon0 + (lon1 - lon0) * fracao
+
+def posicionar_por_trajeto(indice_trajeto, timestamp):
+    """Posição (lat, lon) de uma foto sem GPS pelo horário, ou None se nenhum trajeto cobre"""
+    if not indice_trajeto or not indice_trajeto[0] or timestamp is None:
+        return None
+    tempos, posicoes = indice_trajeto
+    return interpolar_posicao(tempos, posicoes, timestamp)
+
+def agrupar_fotos_semelhantes(fotos):
+    """Junta fotos quase iguais (mesmo lugar e horário) em um registro com variantes
+    
+    A primeira foto do grupo fica como principal; as demais vão para
+    'variantes'. A thumbnail das variantes continua no disco: é dela que
+    saem o dHash e o placeholder, sem baixar e decodificar o original de
+    novo a cada atualização.
+    """
+    grupos = agrupar_duplicatas(fotos, DUPLICATA_MAX_BITS, DUPLICATA_JANELA_SEGUNDOS,
+                                DUPLICATA_RAIO_METROS)
+    
+    resultado = []
+    for grupo in grupos:
+        principal = fotos[grupo[0]]
+        principal['variantes'] = []
+        for indice in grupo[1:]:
+            variante = fotos[indice]
+            principal['variantes'].append({
+                'id': variante['id'],
+                'filename': variante['filename'],
+                'original_url': variante['original_url'],
+                'thumbnail': variante['thumbnail'],
+                'full_image': variante['full_image'],
+                'placeholder': variante['placeholder'],
+                'data_tirada': variante['data_tirada'],
+                'timestamp': variante['timestamp']
+            })
+        if principal['variantes']:
+            print(f"  📚 {principal['filename']}: {len(principal['variantes'])} foto(s) semelhante(s) agrupada(s)")
+        resultado.append(principal)
+    
+    return resultado
+
 def processar_arquivos():
-    """Processa arquivos do GitHub"""
+    """Processa arquivos do GitHub, mantendo o resumo usado por /api/status"""
+    carregar_resumo_cache()
+    atualizar_resumo_cache(atualizando=True, atualizacao_iniciada_em=time.time())
+    try:
+        return gerar_cache()
+    except Exception as e:
+        atualizar_resumo_cache(atualizando=False, ultimo_erro=str(e), ultimo_erro_em=time.time())
+        raise
+
+def gerar_cache():
+    """Lista, baixa e processa os arquivos do GitHub e grava o cache"""
     print("🔄 Processando arquivos...")
+    inicio = time.perf_counter()
+    PROCESSAMENTOS.inc()
     
     # Listar arquivos
     arquivos = listar_arquivos_github()
     
     if not arquivos:
         print("⚠️  Nenhum arquivo encontrado")
+        atualizar_resumo_cache(atualizando=False, ultimo_erro='Nenhum arquivo encontrado no GitHub',
+                               ultimo_erro_em=time.time())
         return {'fotos': [], 'trajetos': []}
     
     fotos = []
     trajetos = []
+    pontos_tempo = []
+    indice_trajeto = None
+    
+    # Trajetos antes das fotos: a geotag das fotos sem GPS precisa de todos
+    # os pontos com horário já lidos
+    arquivos_ordenados = sorted(arquivos, key=lambda nome: not nome.lower().endswith(('.kml', '.gpx')))
     
-    for filename in arquivos:
+    for filename in arquivos_ordenados:
         url = get_github_raw_url(filename)
         
         # Processar imagens (APENAS JPG/JPEG que têm EXIF)
         if filename.lower().endswith(('.jpg', '.jpeg')):
+            if pontos_tempo and indice_trajeto is None:
+                with medir_etapa(DURACAO_ETAPAS, 'geotag', pontos=len(pontos_tempo)):
+                    indice_trajeto = montar_indice_temporal(pontos_tempo)
             print(f"\n📸 Processando imagem: {filename}")
-            foto = processar_imagem_com_exif(url, filename)
+            foto = processar_imagem_com_exif(url, filename, indice_trajeto)
             if foto:
                 fotos.append(foto)
                 print(f"  ✅ Adicionada: {foto['latitude']:.6f}, {foto['longitude']:.6f}")
@@ -315,9 +868,21 @@ def processar_arquivos():
         # Processar KMLs
         elif filename.lower().endswith('.kml'):
             print(f"\n🗺️ Processando KML: {filename}")
-            trajetos_kml = processar_kml_simples(url, filename)
+            trajetos_kml = processar_kml_simples(url, filename, pontos_tempo)
             if trajetos_kml:
                 trajetos.extend(trajetos_kml)
+        
+        # Processar GPXs
+        elif filename.lower().endswith('.gpx'):
+            print(f"\n🗺️ Processando GPX: {filename}")
+            trajetos_gpx = processar_gpx_simples(url, filename, pontos_tempo)
+            if trajetos_gpx:
+                trajetos.extend(trajetos_gpx)
+    
+    # Agrupar rajadas/duplicatas (precisa das posições finais)
+    total_fotos = len(fotos)
+    with medir_etapa(DURACAO_ETAPAS, 'duplicatas', fotos=total_fotos):
+        fotos = agrupar_fotos_semelhantes(fotos)
     
     # Se não encontrou fotos com EXIF, adicionar mensagem
     if len(fotos) == 0:
@@ -337,13 +902,153 @@ def processar_arquivos():
     with open(CACHE_FILE, 'w', encoding='utf-8') as f:
         json.dump(cache_data, f, indent=2, ensure_ascii=False)
     
+    duracao = time.perf_counter() - inicio
+    carregar_resumo_cache()
+    atualizar_resumo_cache(
+        geracao=resumo_cache['geracao'] + 1,
+        processed_at=cache_data['processed_at'],
+        fotos=len(fotos),
+        trajetos=len(trajetos),
+        total_files=len(arquivos),
+        thumbnails=THUMBNAILS_ARQUIVOS.valor(),
+        ultima_duracao_segundos=round(duracao, 3),
+        ultimo_erro=None,
+        ultimo_erro_em=None,
+        atualizando=False
+    )
+    
     print(f"\n✅ Processamento concluído:")
     print(f"   📸 Fotos com GPS: {len(fotos)}")
+    print(f"   🕒 Posições interpoladas: {sum(1 for foto in fotos if foto['posicao_interpolada'])}")
+    print(f"   📚 Agrupadas como variantes: {total_fotos - len(fotos)}")
     print(f"   🗺️  Trajetos KML: {len(trajetos)}")
     print(f"   📁 Total arquivos: {len(arquivos)}")
     
+    DURACAO_ETAPAS.observar(duracao, etapa='processamento')
+    registrar_evento('etapa', etapa='processamento', status='ok',
+                     duracao_ms=round(duracao * 1000, 2), arquivos=len(arquivos),
+                     fotos=len(fotos), trajetos=len(trajetos))
+    
     return cache_data
 
+def ler_cache_recente():
+    """Lê o cache do disco se existir e tiver menos de 1 hora (senão None)"""
+    if os.path.exists(CACHE_FILE):
+        cache_age = time.time() - os.path.getmtime(CACHE_FILE)
+        if cache_age < 3600:
+            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            CACHE_RECARGAS.inc()
+            CACHE_CONSULTAS.inc(resultado='hit')
+            return data
+    
+    CACHE_CONSULTAS.inc(resultado='miss')
+    return None
+
+# Índice id -> URL original, reconstruído quando a geração do cache muda
+indice_fotos = {}
+indice_fotos_geracao = None
+# Caminho do display -> [lock, requisições usando o lock]
+locks_display = {}
+locks_display_lock = threading.Lock()
+
+def buscar_url_foto(foto_id):
+    """Retorna a URL original da foto `foto_id` (ou None se não estiver no cache)"""
+    global indice_fotos, indice_fotos_geracao
+    geracao = carregar_resumo_cache()['geracao']
+    if geracao != indice_fotos_geracao:
+        novo_indice = {}
+        if os.path.exists(CACHE_FILE):
+            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            CACHE_RECARGAS.inc()
+            for foto in data.get('fotos', []):
+                for registro in [foto] + foto.get('variantes', []):
+                    if registro.get('id'):
+                        novo_indice[registro['id']] = registro['original_url']
+        indice_fotos = novo_indice
+        indice_fotos_geracao = geracao
+    return indice_fotos.get(foto_id)
+
+def aceita_webp(accept):
+    """Se o header Accept lista image/webp explicitamente (curingas como */* não contam)"""
+    for item in (accept or '').split(','):
+        tipo, _, parametros = item.partition(';')
+        if tipo.strip().lower() != 'image/webp':
+            continue
+        qualidade = re.search(r'\bq=([0-9.]+)', parametros)
+        try:
+            return qualidade is None or float(qualidade.group(1)) > 0
+        except ValueError:
+            return False
+    return False
+
+@contextmanager
+def lock_display(display_path):
+    """Lock por arquivo display; sai do dicionário quando ninguém mais o usa"""
+    with locks_display_lock:
+        entrada = locks_display.setdefault(display_path, [threading.Lock(), 0])
+        entrada[1] += 1
+    try:
+        with entrada[0]:
+            yield
+    finally:
+        with locks_display_lock:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                locks_display.pop(display_path, None)
+
+def escolher_display(foto_id, aceita_webp):
+    """Formato ('webp' ou 'jpeg') e caminho da versão display de uma foto"""
+    if aceita_webp and features.check('webp'):
+        return 'webp', os.path.join(DISPLAY_FOLDER, f'{foto_id}.webp')
+    return 'jpeg', os.path.join(DISPLAY_FOLDER, f'{foto_id}.jpg')
+
+def gerar_display(url, foto_id, display_path, formato):
+    """Baixa o original e grava a versão display (JPEG progressivo ou WebP)"""
+    arquivo = baixar_para_temporario(url, foto_id, 'display')
+    if arquivo is None:
+        return False
+    
+    with arquivo:
+        renderizar_display(arquivo, foto_id, display_path, formato)
+    return True
+
+def renderizar_display(arquivo, foto_id, display_path, formato):
+    """Grava a versão display a partir do arquivo do original"""
+    with medir_etapa(DURACAO_ETAPAS, 'display', arquivo=foto_id, formato=formato):
+        img = abrir_imagem_reduzida(arquivo, DISPLAY_SIZE)
+        with orcamento_decodificacao.reservar(estimar_memoria(img)):
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail(DISPLAY_SIZE)
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            
+            # Gravar em arquivo temporário e trocar, para nunca servir arquivo pela metade
+            temporario = f'{display_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            if formato == 'webp':
+                img.save(temporario, 'WEBP', quality=80, method=4)
+            else:
+                img.save(temporario, 'JPEG', quality=82, optimize=True, progressive=True)
+            os.replace(temporario, display_path)
+
+# Instrumentação das requisições
+@app.before_request
+def iniciar_cronometro():
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def registrar_requisicao(response):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        duracao = time.perf_counter() - inicio
+        rota = request.url_rule.rule if request.url_rule else 'sem_rota'
+        LATENCIA_REQUISICOES.observar(duracao, rota=rota)
+        REQUISICOES.inc(rota=rota, status=response.status_code)
+        registrar_evento('requisicao', rota=rota, metodo=request.method,
+                         status=response.status_code, duracao_ms=round(duracao * 1000, 2))
+    return response
+
 # Rotas da API
 @app.route('/')
 def index():
@@ -360,13 +1065,10 @@ def listar_fotos():
         print("📡 Recebida requisição /api/fotos")
         
         # Usar cache se disponível e recente (< 1 hora)
-        if os.path.exists(CACHE_FILE):
-            cache_age = time.time() - os.path.getmtime(CACHE_FILE)
-            if cache_age < 3600:
-                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    print(f"📊 Retornando {len(data.get('fotos', []))} fotos do cache")
-                    return jsonify(data.get('fotos', []))
+        data = ler_cache_recente()
+        if data is not None:
+            print(f"📊 Retornando {len(data.get('fotos', []))} fotos do cache")
+            return jsonify(data.get('fotos', []))
         
         # Processar e retornar
         data = processar_arquivos()
@@ -382,14 +1084,9 @@ def listar_fotos():
 def listar_kml():
     """Retorna trajetos KML"""
     try:
-        if os.path.exists(CACHE_FILE):
-            cache_age = time.time() - os.path.getmtime(CACHE_FILE)
-            if cache_age < 3600:
-                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return jsonify({'trajetos': data.get('trajetos', [])})
-        
-        data = processar_arquivos()
+        data = ler_cache_recente()
+        if data is None:
+            data = processar_arquivos()
         return jsonify({'trajetos': data.get('trajetos', [])})
         
     except Exception as e:
@@ -400,13 +1097,10 @@ def listar_kml():
 def listar_tudo():
     """Retorna tudo"""
     try:
-        if os.path.exists(CACHE_FILE):
-            cache_age = time.time() - os.path.getmtime(CACHE_FILE)
-            if cache_age < 3600:
-                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                    return jsonify(json.load(f))
-        
-        return jsonify(processar_arquivos())
+        data = ler_cache_recente()
+        if data is None:
+            data = processar_arquivos()
+        return jsonify(data)
         
     except Exception as e:
         print(f"❌ Erro em /api/all: {e}")
@@ -426,39 +1120,125 @@ def servir_thumbnail(nome_arquivo):
     img_io.seek(0)
     return send_file(img_io, mimetype='image/jpeg')
 
+@app.route('/foto/<foto_id>')
+def servir_foto(foto_id):
+    """Serve a versão display da foto (gerada e guardada no primeiro acesso)"""
+    if not re.fullmatch(r'[0-9a-f]{12}', foto_id):
+        return jsonify({'error': 'Foto não encontrada'}), 404
+    
+    formato, display_path = escolher_display(foto_id, aceita_webp(request.headers.get('Accept')))
+    
+    if not os.path.exists(display_path):
+        url = buscar_url_foto(foto_id)
+        if url is None:
+            return jsonify({'error': 'Foto não encontrada'}), 404
+        
+        # Um lock por foto: requisições simultâneas esperam a mesma geração
+        with lock_display(display_path):
+            if not os.path.exists(display_path):
+                try:
+                    if not gerar_display(url, foto_id, display_path, formato):
+                        return jsonify({'error': 'Erro ao baixar foto'}), 502
+                except (ArquivoGrandeDemais, Image.DecompressionBombError) as e:
+                    print(f"⚠️  Foto grande demais {foto_id}: {e}")
+                    return jsonify({'error': 'Foto grande demais', 'message': str(e)}), 413
+                except requests.RequestException as e:
+                    print(f"❌ Erro ao baixar foto {foto_id}: {e}")
+                    return jsonify({'error': 'Erro ao baixar foto', 'message': str(e)}), 502
+                except Exception as e:
+                    print(f"❌ Erro ao gerar display {foto_id}: {e}")
+                    return jsonify({'error': 'Erro ao gerar foto', 'message': str(e)}), 500
+    
+    response = send_file(display_path, mimetype=f'image/{formato}', max_age=86400, conditional=True)
+    response.vary.add('Accept')
+    return response
+
+@app.route('/foto/<foto_id>/original')
+def servir_foto_original(foto_id):
+    """Repassa o original do GitHub em streaming, com suporte a Range"""
+    url = buscar_url_foto(foto_id)
+    if url is None:
+        return jsonify({'error': 'Foto não encontrada'}), 404
+    
+    headers = {'User-Agent': 'MapaFotosApp/1.0', 'Accept-Encoding': 'identity'}
+    if 'Range' in request.headers:
+        headers['Range'] = request.headers['Range']
+    
+    try:
+        upstream = requests.get(url, headers=headers, stream=True, timeout=30)
+    except requests.RequestException as e:
+        print(f"❌ Erro ao baixar original {foto_id}: {e}")
+        return jsonify({'error': 'Erro ao baixar foto', 'message': str(e)}), 502
+    if upstream.status_code not in (200, 206):
+        status_code = upstream.status_code
+        upstream.close()
+        return jsonify({'error': 'Erro ao baixar foto', 'status': status_code}), 502
+    
+    repassar = {nome: upstream.headers[nome]
+                for nome in ('Content-Type', 'Content-Length', 'Content-Range',
+                             'Accept-Ranges', 'ETag', 'Last-Modified')
+                if nome in upstream.headers}
+    
+    def gerar():
+        try:
+            for bloco in upstream.iter_content(64 * 1024):
+                BYTES_BAIXADOS.inc(len(bloco), tipo='original')
+                yield bloco
+        finally:
+            upstream.close()
+    
+    return Response(stream_with_context(gerar()), status=upstream.status_code, headers=repassar)
+
 @app.route('/api/status')
 def status():
-    """Status do sistema"""
+    """Status do sistema (a partir do resumo do cache, sem ler o cache completo)"""
     try:
-        cache_exists = os.path.exists(CACHE_FILE)
-        cache_age = 0
-        fotos_count = 0
-        trajetos_count = 0
-        
-        if cache_exists:
-            cache_age = time.time() - os.path.getmtime(CACHE_FILE)
-            try:
-                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    fotos_count = len(data.get('fotos', []))
-                    trajetos_count = len(data.get('trajetos', []))
-            except:
-                pass
-        
-        return jsonify({
-            'status': 'online',
-            'github_repo': GITHUB_REPO,
-            'cache_exists': cache_exists,
-            'cache_age_minutes': int(cache_age / 60),
-            'fotos_com_gps': fotos_count,
-            'trajetos_kml': trajetos_count,
-            'thumbnails': len(os.listdir(THUMBNAIL_FOLDER)) if os.path.exists(THUMBNAIL_FOLDER) else 0,
-            'timestamp': time.time()
-        })
+        return jsonify(montar_status())
         
     except Exception as e:
         return jsonify({'error': str(e), 'status': 'error'}), 500
 
+def montar_status():
+    """Monta a resposta de /api/status (compartilhada com o modo ASGI)"""
+    resumo = carregar_resumo_cache()
+    agora = time.time()
+    cache_exists = resumo['processed_at'] is not None
+    cache_age = agora - resumo['processed_at'] if cache_exists else 0
+    
+    # Worker morto no meio do processamento deixa 'atualizando' gravado no resumo
+    atualizando = resumo['atualizando']
+    atualizacao_expirada = bool(
+        atualizando and resumo['atualizacao_iniciada_em'] is not None
+        and agora - resumo['atualizacao_iniciada_em'] > MAX_DURACAO_ATUALIZACAO)
+    
+    return {
+        'status': 'online',
+        'github_repo': GITHUB_REPO,
+        'cache_exists': cache_exists,
+        'cache_age_minutes': int(cache_age / 60),
+        'fotos_com_gps': resumo['fotos'],
+        'trajetos_kml': resumo['trajetos'],
+        'thumbnails': resumo['thumbnails'],
+        'geracao': resumo['geracao'],
+        'ultima_duracao_segundos': resumo['ultima_duracao_segundos'],
+        'ultimo_erro': resumo['ultimo_erro'],
+        'ultimo_erro_em': resumo['ultimo_erro_em'],
+        'atualizando': atualizando and not atualizacao_expirada,
+        'atualizacao_expirada': atualizacao_expirada,
+        'atualizacao_iniciada_em': resumo['atualizacao_iniciada_em'],
+        'timestamp': agora
+    }
+
+@app.route('/healthz')
+def healthz():
+    """Health check sem acesso ao disco"""
+    return jsonify({'status': 'ok', 'uptime_segundos': int(time.time() - INICIO_PROCESSO)})
+
+@app.route('/metrics')
+def metrics():
+    """Métricas no formato de texto do Prometheus"""
+    return Response(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/refresh')
 def refresh():
     """Força atualização"""
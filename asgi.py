@@ -0,0 +1,341 @@
+"""
+Modo ASGI do mapa de fotos (Starlette), com as mesmas rotas do app.py.
+
+Nenhuma requisição prende um worker: buscas no GitHub usam httpx assíncrono,
+trabalho de CPU (JSON grande, Pillow, ingestão) vai para o pool de threads, e
+arquivos estáticos/thumbnails saem por FileResponse, que usa
+`http.response.pathsend` (envio sem cópia) quando o servidor suporta.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+    granian --interface asgi --host 0.0.0.0 --port $PORT asgi:app  # com pathsend
+"""
+
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from io import BytesIO
+
+import httpx
+from PIL import Image
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+import app as mapa
+from metricas import registrar_evento
+
+# Cache em memória: dados e respostas JSON já serializadas por rota, válidos
+# enquanto o mtime do fotos_cache.json não mudar
+estado_cache = {'mtime': None, 'data': None, 'corpos': {}}
+trava_processamento = asyncio.Lock()
+# Caminho do display -> [trava, requisições usando a trava]
+travas_display = {}
+
+
+def ler_cache_em_memoria():
+    """Dados do cache se recente (< 1 hora), relendo o arquivo só quando muda"""
+    try:
+        mtime = os.stat(mapa.CACHE_FILE).st_mtime
+    except FileNotFoundError:
+        return None
+    if time.time() - mtime >= 3600:
+        return None
+
+    if mtime != estado_cache['mtime']:
+        with open(mapa.CACHE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        mapa.CACHE_RECARGAS.inc()
+        estado_cache.update(mtime=mtime, data=data, corpos={})
+    return estado_cache['data']
+
+
+async def obter_dados():
+    """Dados do cache; se vencido, processa uma única vez para todas as requisições"""
+    data = await run_in_threadpool(ler_cache_em_memoria)
+    if data is not None:
+        mapa.CACHE_CONSULTAS.inc(resultado='hit')
+        return data
+
+    mapa.CACHE_CONSULTAS.inc(resultado='miss')
+    async with trava_processamento:
+        # Outra requisição pode ter atualizado o cache enquanto esperávamos
+        data = await run_in_threadpool(ler_cache_em_memoria)
+        if data is None:
+            data = await run_in_threadpool(mapa.processar_arquivos)
+    return data
+
+
+async def resposta_json(chave, data, extrair):
+    """Serializa `extrair(data)` uma vez por versão do cache e reaproveita os bytes"""
+    corpos = estado_cache['corpos'] if data is estado_cache['data'] else {}
+    corpo = corpos.get(chave)
+    if corpo is None:
+        corpo = await run_in_threadpool(
+            lambda: json.dumps(extrair(data), ensure_ascii=False).encode('utf-8'))
+        corpos[chave] = corpo
+    return Response(corpo, media_type='application/json')
+
+
+# Rotas da API
+async def listar_fotos(request):
+    """Retorna apenas fotos"""
+    try:
+        data = await obter_dados()
+        return await resposta_json('fotos', data, lambda d: d.get('fotos', []))
+    except Exception as e:
+        print(f"❌ Erro em /api/fotos: {e}")
+        return JSONResponse({'error': 'Erro interno', 'message': str(e)}, status_code=500)
+
+
+async def listar_kml(request):
+    """Retorna trajetos KML"""
+    try:
+        data = await obter_dados()
+        return await resposta_json('kml', data, lambda d: {'trajetos': d.get('trajetos', [])})
+    except Exception as e:
+        print(f"❌ Erro em /api/kml: {e}")
+        return JSONResponse({'trajetos': []})
+
+
+async def listar_tudo(request):
+    """Retorna tudo"""
+    try:
+        data = await obter_dados()
+        return await resposta_json('all', data, lambda d: d)
+    except Exception as e:
+        print(f"❌ Erro em /api/all: {e}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+def _thumbnail_padrao():
+    img = Image.new('RGB', (300, 200), color='#f0f0f0')
+    img_io = BytesIO()
+    img.save(img_io, 'JPEG')
+    return img_io.getvalue()
+
+THUMBNAIL_PADRAO = _thumbnail_padrao()
+
+
+async def servir_thumbnail(request):
+    """Serve thumbnail"""
+    nome_arquivo = request.path_params['nome_arquivo']
+    caminho = os.path.join(mapa.THUMBNAIL_FOLDER, os.path.basename(nome_arquivo))
+    if os.path.isfile(caminho):
+        return FileResponse(caminho, media_type='image/jpeg')
+
+    # Thumbnail padrão
+    return Response(THUMBNAIL_PADRAO, media_type='image/jpeg')
+
+
+async def baixar_para_temporario(cliente, url):
+    """Versão assíncrona de app.baixar_para_temporario (mesmos limites e erros)"""
+    inicio = time.perf_counter()
+    try:
+        async with cliente.stream('GET', url) as upstream:
+            if upstream.status_code != 200:
+                return None
+            tamanho = int(upstream.headers.get('Content-Length') or 0)
+            if tamanho > mapa.MAX_BYTES_IMAGEM:
+                mapa.ARQUIVOS_RECUSADOS.inc(motivo='bytes')
+                raise mapa.ArquivoGrandeDemais(f'{tamanho} bytes (limite {mapa.MAX_BYTES_IMAGEM})')
+
+            # Escritas no pool de threads: passando de SPOOL_MAX_MEMORIA o
+            # arquivo vai para o disco, e write() bloquearia o loop
+            destino = tempfile.SpooledTemporaryFile(max_size=mapa.SPOOL_MAX_MEMORIA)
+            total = 0
+            try:
+                async for bloco in upstream.aiter_bytes(64 * 1024):
+                    total += len(bloco)
+                    if total > mapa.MAX_BYTES_IMAGEM:
+                        mapa.ARQUIVOS_RECUSADOS.inc(motivo='bytes')
+                        raise mapa.ArquivoGrandeDemais(f'mais de {mapa.MAX_BYTES_IMAGEM} bytes')
+                    await run_in_threadpool(destino.write, bloco)
+            except BaseException:
+                destino.close()
+                raise
+    finally:
+        mapa.DURACAO_ETAPAS.observar(time.perf_counter() - inicio, etapa='download')
+
+    mapa.BYTES_BAIXADOS.inc(total, tipo='display')
+    destino.seek(0)
+    return destino
+
+
+async def servir_foto(request):
+    """Serve a versão display da foto (gerada e guardada no primeiro acesso)"""
+    foto_id = request.path_params['foto_id']
+    if not re.fullmatch(r'[0-9a-f]{12}', foto_id):
+        return JSONResponse({'error': 'Foto não encontrada'}, status_code=404)
+
+    formato, display_path = mapa.escolher_display(foto_id, mapa.aceita_webp(request.headers.get('accept')))
+
+    if not os.path.exists(display_path):
+        url = await run_in_threadpool(mapa.buscar_url_foto, foto_id)
+        if url is None:
+            return JSONResponse({'error': 'Foto não encontrada'}, status_code=404)
+
+        # Uma trava por foto: requisições simultâneas esperam a mesma geração
+        entrada = travas_display.setdefault(display_path, [asyncio.Lock(), 0])
+        entrada[1] += 1
+        try:
+            async with entrada[0]:
+                if not os.path.exists(display_path):
+                    arquivo = await baixar_para_temporario(request.app.state.http, url)
+                    if arquivo is None:
+                        return JSONResponse({'error': 'Erro ao baixar foto'}, status_code=502)
+                    with arquivo:
+                        await run_in_threadpool(mapa.renderizar_display, arquivo,
+                                                foto_id, display_path, formato)
+        except (mapa.ArquivoGrandeDemais, Image.DecompressionBombError) as e:
+            print(f"⚠️  Foto grande demais {foto_id}: {e}")
+            return JSONResponse({'error': 'Foto grande demais', 'message': str(e)}, status_code=413)
+        except httpx.HTTPError as e:
+            print(f"❌ Erro ao baixar foto {foto_id}: {e}")
+            return JSONResponse({'error': 'Erro ao baixar foto', 'message': str(e)}, status_code=502)
+        except Exception as e:
+            print(f"❌ Erro ao gerar display {foto_id}: {e}")
+            return JSONResponse({'error': 'Erro ao gerar foto', 'message': str(e)}, status_code=500)
+        finally:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                travas_display.pop(display_path, None)
+
+    return FileResponse(display_path, media_type=f'image/{formato}',
+                        headers={'Cache-Control': 'public, max-age=86400', 'Vary': 'Accept'})
+
+
+async def servir_foto_original(request):
+    """Repassa o original do GitHub em streaming, com suporte a Range"""
+    url = await run_in_threadpool(mapa.buscar_url_foto, request.path_params['foto_id'])
+    if url is None:
+        return JSONResponse({'error': 'Foto não encontrada'}, status_code=404)
+
+    headers = {'Accept-Encoding': 'identity'}
+    if 'range' in request.headers:
+        headers['Range'] = request.headers['range']
+
+    cliente = request.app.state.http
+    try:
+        upstream = await cliente.send(cliente.build_request('GET', url, headers=headers), stream=True)
+    except httpx.HTTPError as e:
+        print(f"❌ Erro ao baixar original: {e}")
+        return JSONResponse({'error': 'Erro ao baixar foto', 'message': str(e)}, status_code=502)
+    if upstream.status_code not in (200, 206):
+        await upstream.aclose()
+        return JSONResponse({'error': 'Erro ao baixar foto', 'status': upstream.status_code}, status_code=502)
+
+    repassar = {nome: upstream.headers[nome]
+                for nome in ('Content-Type', 'Content-Length', 'Content-Range',
+                             'Accept-Ranges', 'ETag', 'Last-Modified')
+                if nome in upstream.headers}
+
+    async def gerar():
+        # Fechar aqui e não numa BackgroundTask: se o cliente desconecta,
+        # o Starlette não roda as tarefas de fundo e a conexão vazaria do pool
+        try:
+            async for bloco in upstream.aiter_raw(64 * 1024):
+                mapa.BYTES_BAIXADOS.inc(len(bloco), tipo='original')
+                yield bloco
+        finally:
+            await upstream.aclose()
+
+    return StreamingResponse(gerar(), status_code=upstream.status_code, headers=repassar)
+
+
+async def status(request):
+    """Status do sistema (a partir do resumo do cache, sem ler o cache completo)"""
+    try:
+        return JSONResponse(await run_in_threadpool(mapa.montar_status))
+    except Exception as e:
+        return JSONResponse({'error': str(e), 'status': 'error'}, status_code=500)
+
+
+async def healthz(request):
+    """Health check sem acesso ao disco"""
+    return JSONResponse({'status': 'ok', 'uptime_segundos': int(time.time() - mapa.INICIO_PROCESSO)})
+
+
+async def metrics(request):
+    """Métricas no formato de texto do Prometheus"""
+    return PlainTextResponse(mapa.metricas.exportar(), media_type='text/plain; version=0.0.4')
+
+
+async def refresh(request):
+    """Força atualização"""
+    async with trava_processamento:
+        data = await run_in_threadpool(mapa.processar_arquivos)
+    return JSONResponse({
+        'success': True,
+        'fotos': len(data.get('fotos', [])),
+        'trajetos': len(data.get('trajetos', [])),
+        'message': 'Cache atualizado'
+    })
+
+
+class MedirRequisicoes:
+    """Middleware ASGI: latência e contagem por rota, como o before/after_request do Flask"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        status_code = 500
+
+        async def enviar(mensagem):
+            nonlocal status_code
+            if mensagem['type'] == 'http.response.start':
+                status_code = mensagem['status']
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracao = time.perf_counter() - inicio
+            # Mesmos rótulos do Flask: '/foto/{foto_id}' vira '/foto/<foto_id>'
+            rota = getattr(scope.get('route'), 'path', None) or 'sem_rota'
+            rota = re.sub(r'\{(\w+)\}', r'<\1>', rota)
+            if isinstance(scope.get('route'), Mount):
+                rota = '/<path:filename>'
+            mapa.LATENCIA_REQUISICOES.observar(duracao, rota=rota)
+            mapa.REQUISICOES.inc(rota=rota, status=status_code)
+            registrar_evento('requisicao', rota=rota, metodo=scope['method'],
+                             status=status_code, duracao_ms=round(duracao * 1000, 2))
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    limites = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    async with httpx.AsyncClient(timeout=30, limits=limites, follow_redirects=True,
+                                 headers={'User-Agent': 'MapaFotosApp/1.0'}) as cliente:
+        app.state.http = cliente
+        yield
+
+
+app = Starlette(
+    routes=[
+        Route('/api/fotos', listar_fotos),
+        Route('/api/kml', listar_kml),
+        Route('/api/all', listar_tudo),
+        Route('/api/status', status),
+        Route('/api/refresh', refresh),
+        Route('/thumbnail/{nome_arquivo}', servir_thumbnail),
+        Route('/foto/{foto_id}', servir_foto),
+        Route('/foto/{foto_id}/original', servir_foto_original),
+        Route('/healthz', healthz),
+        Route('/metrics', metrics),
+        Mount('/', StaticFiles(directory=mapa.BASE_DIR, html=True)),
+    ],
+    lifespan=ciclo_de_vida,
+)
+app.add_middleware(MedirRequisicoes)
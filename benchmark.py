@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+"""
+Benchmark reproduzível da ingestão e da API do mapa de fotos.
+
+Gera um conjunto sintético (JPEGs com GPS/data no EXIF, trajetos KML e GPX
+com horário), serve os arquivos por um servidor HTTP local que imita a API
+de conteúdo e os arquivos raw do GitHub, e mede:
+
+  - exif:          extração de coordenadas e data
+  - thumbnail:     geração de thumbnail
+  - kml / gpx:     parse de trajetos grandes
+  - geotag:        interpolação de fotos sem GPS nos trajetos
+  - duplicatas:    agrupamento de quase duplicatas (dHash + árvore BK)
+  - ingestao:      processar_arquivos() ponta a ponta
+  - api:           latência de /api/* sob carga concorrente (Flask e/ou
+                   Starlette, com --modo wsgi|asgi|ambos)
+
+Uso:
+    python benchmark.py --tamanhos 100,1000 --saida bench_resultados.json
+    python benchmark.py --tamanhos 100000 --so api --modo ambos
+
+Os resultados em JSON servem para comparar versões e achar regressões.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from multiprocessing import Process
+
+import requests
+from PIL import Image, TiffImagePlugin
+
+# Centro dos dados sintéticos (São Paulo) e início dos trajetos (UTC)
+CENTRO = (-23.55, -46.63)
+INICIO_TRAJETO = datetime(2025, 12, 16, 13, 0, 0, tzinfo=timezone.utc)
+REPO_FALSO = 'bench/fotos-mapa'
+ETAPAS = ('exif', 'thumbnail', 'kml', 'gpx', 'geotag', 'duplicatas', 'ingestao', 'api')
+
+
+# ---------------------------------------------------------------------------
+# Geração do conjunto sintético
+# ---------------------------------------------------------------------------
+
+def _racional_gms(valor):
+    """Converte grau decimal em (graus, minutos, segundos) racionais do EXIF"""
+    valor = abs(valor)
+    graus = int(valor)
+    minutos = int((valor - graus) * 60)
+    segundos = round(((valor - graus) * 60 - minutos) * 60 * 1000)
+    return (TiffImagePlugin.IFDRational(graus, 1),
+            TiffImagePlugin.IFDRational(minutos, 1),
+            TiffImagePlugin.IFDRational(segundos, 1000))
+
+
+def gerar_jpeg(rng, latitude, longitude, data_local, tamanho=(640, 480)):
+    """Gera um JPEG com GPS (opcional) e data no EXIF"""
+    cor = tuple(rng.randrange(256) for _ in range(3))
+    img = Image.new('RGB', tamanho, cor)
+    # Um retângulo aleatório para a imagem não ser totalmente uniforme
+    x, y = rng.randrange(tamanho[0] // 2), rng.randrange(tamanho[1] // 2)
+    img.paste(tuple(255 - c for c in cor), (x, y, x + tamanho[0] // 3, y + tamanho[1] // 3))
+
+    exif = Image.Exif()
+    data_exif = data_local.strftime('%Y:%m:%d %H:%M:%S')
+    exif[0x0132] = data_exif  # DateTime
+    exif.get_ifd(0x8769)[0x9003] = data_exif  # DateTimeOriginal
+    if latitude is not None:
+        gps = exif.get_ifd(0x8825)
+        gps[1] = 'S' if latitude < 0 else 'N'
+        gps[2] = _racional_gms(latitude)
+        gps[3] = 'W' if longitude < 0 else 'E'
+        gps[4] = _racional_gms(longitude)
+
+    buffer = BytesIO()
+    img.save(buffer, 'JPEG', quality=85, exif=exif)
+    return buffer.getvalue()
+
+
+def gerar_trajeto(rng, pontos, intervalo=1.0):
+    """Passeio aleatório com horário: lista de (datetime UTC, lat, lon)"""
+    lat, lon = CENTRO
+    trajeto = []
+    for i in range(pontos):
+        lat += rng.uniform(-0.0001, 0.0001)
+        lon += rng.uniform(-0.0001, 0.0001)
+        trajeto.append((INICIO_TRAJETO + timedelta(seconds=i * intervalo), lat, lon))
+    return trajeto
+
+
+def _iso(data):
+    return data.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def gerar_kml(trajeto):
+    """KML com um Placemark de gx:Track (pares <when>/<gx:coord>)"""
+    partes = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">'
+              '<Document><Placemark><name>Trajeto sintético</name><gx:Track>\n']
+    partes.extend(f'<when>{_iso(data)}</when>\n' for data, _, _ in trajeto)
+    partes.extend(f'<gx:coord>{lon:.7f} {lat:.7f} 0</gx:coord>\n' for _, lat, lon in trajeto)
+    partes.append('</gx:Track></Placemark></Document></kml>\n')
+    return ''.join(partes)
+
+
+def gerar_gpx(trajeto):
+    """GPX com um trk/trkseg"""
+    partes = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<gpx version="1.1" creator="benchmark.py"><trk><name>Trajeto sintético</name><trkseg>\n']
+    partes.extend(f'<trkpt lat="{lat:.7f}" lon="{lon:.7f}"><time>{_iso(data)}</time></trkpt>\n'
+                  for data, lat, lon in trajeto)
+    partes.append('</trkseg></trk></gpx>\n')
+    return ''.join(partes)
+
+
+def gerar_conjunto(pasta, fotos, pontos_trajeto, fracao_sem_gps, seed, fuso_camera):
+    """Grava o conjunto sintético em `pasta` e retorna a lista de arquivos"""
+    rng = random.Random(seed)
+    os.makedirs(pasta, exist_ok=True)
+    trajeto = gerar_trajeto(rng, pontos_trajeto)
+
+    with open(os.path.join(pasta, 'trajeto.kml'), 'w', encoding='utf-8') as f:
+        f.write(gerar_kml(trajeto))
+    with open(os.path.join(pasta, 'trajeto.gpx'), 'w', encoding='utf-8') as f:
+        f.write(gerar_gpx(trajeto))
+
+    fuso = timezone(timedelta(hours=fuso_camera))
+    for i in range(fotos):
+        data, lat, lon = trajeto[rng.randrange(len(trajeto))]
+        if rng.random() < fracao_sem_gps:
+            lat = lon = None
+        conteudo = gerar_jpeg(rng, lat, lon, data.astimezone(fuso).replace(tzinfo=None))
+        with open(os.path.join(pasta, f'foto_{i:06d}.jpg'), 'wb') as f:
+            f.write(conteudo)
+
+    return sorted(os.listdir(pasta))
+
+
+# ---------------------------------------------------------------------------
+# Servidor local que imita o GitHub
+# ---------------------------------------------------------------------------
+
+class GitHubFalsoHandler(SimpleHTTPRequestHandler):
+    """Serve /repos/<repo>/contents/ (listagem) e /<repo>/<branch>/<arquivo> (raw)"""
+
+    def do_GET(self):
+        if self.path.startswith('/repos/') and '/contents' in self.path:
+            itens = [{'name': nome, 'type': 'file'} for nome in sorted(os.listdir(self.directory))]
+            corpo = json.dumps(itens).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.send_header('X-RateLimit-Remaining', '5000')
+            self.end_headers()
+            self.wfile.write(corpo)
+            return
+
+        # Raw: só o nome do arquivo importa
+        self.path = '/' + self.path.rstrip('/').rsplit('/', 1)[-1]
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _rodar_servidor(pasta, porta):
+    handler = lambda *args, **kwargs: GitHubFalsoHandler(*args, directory=pasta, **kwargs)
+    ThreadingHTTPServer(('127.0.0.1', porta), handler).serve_forever()
+
+
+def iniciar_servidor(pasta, porta):
+    """Sobe o servidor em outro processo (não disputa o GIL com a ingestão)"""
+    processo = Process(target=_rodar_servidor, args=(pasta, porta), daemon=True)
+    processo.start()
+    for _ in range(100):
+        try:
+            requests.get(f'http://127.0.0.1:{porta}/repos/x/contents/', timeout=1)
+            return processo
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    processo.terminate()
+    raise RuntimeError(f'Servidor local não respondeu na porta {porta}')
+
+
+# ---------------------------------------------------------------------------
+# Medições
+# ---------------------------------------------------------------------------
+
+def resumir(duracoes):
+    """Estatísticas (ms) de uma lista de durações em segundos"""
+    ordenadas = sorted(duracoes)
+    n = len(ordenadas)
+    if not n:
+        return {'n': 0}
+
+    def percentil(p):
+        return round(ordenadas[min(n - 1, int(p * n))] * 1000, 3)
+
+    return {
+        'n': n,
+        'media_ms': round(statistics.fmean(ordenadas) * 1000, 3),
+        'p50_ms': percentil(0.50),
+        'p95_ms': percentil(0.95),
+        'p99_ms': percentil(0.99),
+        'max_ms': round(ordenadas[-1] * 1000, 3),
+        'total_s': round(sum(ordenadas), 3)
+    }
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def bench_exif(app, pasta, arquivos, amostra):
+    duracoes = []
+    for nome in [a for a in arquivos if a.endswith('.jpg')][:amostra]:
+        with open(os.path.join(pasta, nome), 'rb') as f:
+            dados = BytesIO(f.read())
+
+        def extrair():
+            dados.seek(0)
+            app.extrair_coordenadas_exif(dados)
+            dados.seek(0)
+            app.extrair_data_exif(dados)
+
+        duracoes.append(cronometrar(extrair)[0])
+    return resumir(duracoes)
+
+
+def bench_thumbnail(app, pasta, arquivos, amostra, destino):
+    duracoes = []
+    for nome in [a for a in arquivos if a.endswith('.jpg')][:amostra]:
+        with open(os.path.join(pasta, nome), 'rb') as f:
+            dados = BytesIO(f.read())
+        duracoes.append(cronometrar(app.gerar_thumbnail, dados, os.path.join(destino, nome))[0])
+    return resumir(duracoes)
+
+
+def bench_trajeto(app, pasta, nome, funcao):
+    with open(os.path.join(pasta, nome), 'r', encoding='utf-8') as f:
+        conteudo = f.read()
+    pontos_tempo = []
+    duracao, trajetos = cronometrar(funcao, conteudo, nome, pontos_tempo)
+    # Vazão sobre os pontos lidos; a linha desenhada é reduzida (MAX_PONTOS_DESENHO)
+    pontos = len(pontos_tempo)
+    return {
+        'bytes': len(conteudo),
+        'pontos': pontos,
+        'pontos_desenhados': sum(len(t['coordinates']) for t in trajetos),
+        'duracao_s': round(duracao, 3),
+        'pontos_por_s': round(pontos / duracao) if duracao else None
+    }
+
+
+def bench_geotag(app, pontos_trajeto, fotos, seed):
+    rng = random.Random(seed)
+    trajeto = gerar_trajeto(rng, pontos_trajeto)
+    pontos_tempo = [(data.timestamp(), lat, lon) for data, lat, lon in trajeto]
+    registros = [{
+        'filename': f'foto_{i}.jpg',
+        'latitude': None,
+        'longitude': None,
+        'timestamp': trajeto[rng.randrange(len(trajeto))][0].timestamp() + rng.random(),
+        'posicao_interpolada': False
+    } for i in range(fotos)]
+
+    def posicionar():
+        # Como na ingestão: índice montado uma vez, uma busca por foto
+        indice = app.montar_indice_temporal(pontos_tempo)
+        return [app.posicionar_por_trajeto(indice, registro['timestamp']) for registro in registros]
+
+    duracao, posicoes = cronometrar(posicionar)
+    return {
+        'fotos': fotos,
+        'pontos_trajeto': pontos_trajeto,
+        'posicionadas': sum(1 for posicao in posicoes if posicao is not None),
+        'duracao_s': round(duracao, 3),
+        'fotos_por_s': round(fotos / duracao) if duracao else None
+    }
+
+
+def bench_duplicatas(app, fotos, seed):
+    """Registros sintéticos em rajadas de 1 a 5 fotos com hashes vizinhos"""
+    from duplicatas import agrupar_duplicatas
+
+    rng = random.Random(seed)
+    registros = []
+    while len(registros) < fotos:
+        base = rng.getrandbits(64)
+        timestamp = INICIO_TRAJETO.timestamp() + rng.uniform(0, 86400 * 30)
+        lat = CENTRO[0] + rng.uniform(-0.5, 0.5)
+        lon = CENTRO[1] + rng.uniform(-0.5, 0.5)
+        for _ in range(rng.randint(1, 5)):
+            ruido = 0
+            for _ in range(rng.randint(0, 4)):
+                ruido |= 1 << rng.randrange(64)
+            registros.append({'dhash': f'{base ^ ruido:016x}', 'timestamp': timestamp + rng.uniform(0, 10),
+                              'latitude': lat, 'longitude': lon})
+    registros = registros[:fotos]
+
+    duracao, grupos = cronometrar(agrupar_duplicatas, registros, app.DUPLICATA_MAX_BITS,
+                                  app.DUPLICATA_JANELA_SEGUNDOS, app.DUPLICATA_RAIO_METROS)
+    return {
+        'fotos': fotos,
+        'grupos': len(grupos),
+        'duracao_s': round(duracao, 3),
+        'fotos_por_s': round(fotos / duracao) if duracao else None
+    }
+
+
+def bench_ingestao(app, total_arquivos):
+    saida, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        duracao, data = cronometrar(app.processar_arquivos)
+    finally:
+        sys.stdout.close()
+        sys.stdout = saida
+    return {
+        'arquivos': total_arquivos,
+        'fotos': len(data.get('fotos', [])),
+        'trajetos': len(data.get('trajetos', [])),
+        'duracao_s': round(duracao, 3),
+        'arquivos_por_s': round(total_arquivos / duracao, 2) if duracao else None
+    }
+
+
+def gerar_cache_sintetico(app, fotos, seed):
+    """Grava um fotos_cache.json com `fotos` fotos (sem passar pela ingestão)
+
+    Os registros têm os mesmos campos que processar_imagem_com_exif gera
+    (id, placeholder em data URI, dHash, /foto/<id>); ~20% dos registros são
+    rajadas de 2 a 5 fotos agrupadas em 'variantes', como em
+    agrupar_fotos_semelhantes.
+    """
+    rng = random.Random(seed)
+
+    # Placeholders reais (WebP/JPEG de 16px) de imagens com algum detalhe
+    placeholders = []
+    for _ in range(32):
+        base = Image.new('RGB', (4, 3))
+        base.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(12)])
+        placeholders.append(app.gerar_placeholder(base.resize((300, 225), Image.Resampling.BILINEAR)))
+
+    def registro(i, latitude, longitude, timestamp):
+        nome = f'foto_{i:06d}.jpg'
+        url = app.get_github_raw_url(nome)
+        foto_id = hashlib.md5(url.encode()).hexdigest()[:12]
+        return {
+            'id': foto_id,
+            'filename': nome,
+            'original_url': url,
+            'thumbnail': f'/thumbnail/{foto_id}.jpg',
+            'full_image': f'/foto/{foto_id}',
+            'placeholder': rng.choice(placeholders),
+            'dhash': f'{rng.getrandbits(64):016x}',
+            'latitude': latitude,
+            'longitude': longitude,
+            'data_tirada': datetime.fromtimestamp(timestamp).strftime('%Y:%m:%d %H:%M:%S'),
+            'timestamp': timestamp,
+            'posicao_interpolada': rng.random() < 0.1,
+            'processed_at': time.time()
+        }
+
+    registros = []
+    i = 0
+    while i < fotos:
+        latitude = CENTRO[0] + rng.uniform(-0.5, 0.5)
+        longitude = CENTRO[1] + rng.uniform(-0.5, 0.5)
+        timestamp = INICIO_TRAJETO.timestamp() + i * 60
+        principal = registro(i, latitude, longitude, timestamp)
+        principal['variantes'] = []
+        rajada = 1 if rng.random() < 0.8 else rng.randint(2, 5)
+        for j in range(1, min(rajada, fotos - i)):
+            variante = registro(i + j, latitude, longitude, timestamp + j)
+            principal['variantes'].append({campo: variante[campo] for campo in (
+                'id', 'filename', 'original_url', 'thumbnail', 'full_image',
+                'placeholder', 'data_tirada', 'timestamp')})
+        registros.append(principal)
+        i += 1 + len(principal['variantes'])
+
+    with open(app.CACHE_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'fotos': registros, 'trajetos': [], 'processed_at': time.time(),
+                   'total_files': fotos, 'image_count': len(registros), 'kml_count': 0}, f)
+    return len(registros)
+
+
+def iniciar_servidor_api(app, modo, porta):
+    """Sobe o app Flask (werkzeug com threads) ou o ASGI (uvicorn) numa thread
+
+    Retorna a função que para o servidor.
+    """
+    if modo == 'asgi':
+        import uvicorn
+        import asgi
+
+        servidor = uvicorn.Server(uvicorn.Config(asgi.app, host='127.0.0.1', port=porta,
+                                                 log_level='error', access_log=False))
+        thread = threading.Thread(target=servidor.run, daemon=True)
+        thread.start()
+        while not servidor.started:
+            if not thread.is_alive():
+                raise RuntimeError(f'uvicorn não subiu na porta {porta}')
+            time.sleep(0.05)
+
+        def parar():
+            servidor.should_exit = True
+            thread.join()
+        return parar
+
+    from werkzeug.serving import make_server
+
+    servidor = make_server('127.0.0.1', porta, app.app, threaded=True)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    return servidor.shutdown
+
+
+def bench_api(app, rotas, requisicoes, concorrencia, porta, modo='wsgi'):
+    """Sobe o app (WSGI ou ASGI) e mede a latência das rotas sob carga"""
+    base = f'http://127.0.0.1:{porta}'
+    local = threading.local()
+
+    def requisitar(rota):
+        sessao = getattr(local, 'sessao', None)
+        if sessao is None:
+            sessao = local.sessao = requests.Session()
+        inicio = time.perf_counter()
+        resposta = sessao.get(base + rota, timeout=120)
+        resposta.content
+        return time.perf_counter() - inicio, resposta.status_code, len(resposta.content)
+
+    resultados = {}
+    # Silenciar os prints por requisição das rotas
+    saida, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    parar = iniciar_servidor_api(app, modo, porta)
+    try:
+        for rota in rotas:
+            requisitar(rota)  # aquecimento
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(concorrencia) as executor:
+                medidas = list(executor.map(requisitar, [rota] * requisicoes))
+            duracao = time.perf_counter() - inicio
+            resultados[rota] = {
+                **resumir([m[0] for m in medidas]),
+                'erros': sum(1 for m in medidas if m[1] != 200),
+                'bytes_resposta': medidas[-1][2],
+                'requisicoes_por_s': round(requisicoes / duracao, 1)
+            }
+    finally:
+        parar()
+        sys.stdout.close()
+        sys.stdout = saida
+    return resultados
+
+
+# ---------------------------------------------------------------------------
+# Execução
+# ---------------------------------------------------------------------------
+
+def commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do mapa de fotos')
+    parser.add_argument('--tamanhos', default='100,1000',
+                        help='quantidades de fotos, separadas por vírgula (ex: 100,1000,10000,100000)')
+    parser.add_argument('--pontos-trajeto', type=int, default=100000,
+                        help='pontos dos trajetos KML/GPX gerados')
+    parser.add_argument('--sem-gps', type=float, default=0.1,
+                        help='fração das fotos geradas sem GPS (geotag pelo trajeto)')
+    parser.add_argument('--amostra', type=int, default=200,
+                        help='fotos usadas nas medições por foto (exif, thumbnail)')
+    parser.add_argument('--max-ingestao', type=int, default=10000,
+                        help='maior tamanho em que a ingestão ponta a ponta é executada')
+    parser.add_argument('--requisicoes', type=int, default=200, help='requisições por rota')
+    parser.add_argument('--concorrencia', type=int, default=16, help='clientes simultâneos')
+    parser.add_argument('--so', default=','.join(ETAPAS),
+                        help=f'etapas a executar ({",".join(ETAPAS)})')
+    parser.add_argument('--modo', choices=('wsgi', 'asgi', 'ambos'), default='wsgi',
+                        help='servidor da etapa api: Flask (WSGI), Starlette (ASGI) ou ambos')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--porta', type=int, default=8765, help='porta do GitHub falso (API usa porta+1)')
+    parser.add_argument('--saida', default='bench_resultados.json')
+    parser.add_argument('--manter', action='store_true', help='não apagar os dados gerados')
+    args = parser.parse_args()
+
+    tamanhos = [int(t) for t in args.tamanhos.split(',') if t.strip()]
+    etapas = set(e.strip() for e in args.so.split(','))
+    trabalho = tempfile.mkdtemp(prefix='mapa_fotos_bench_')
+
+    # Importar o app apontando GitHub, cache e thumbnails para o diretório temporário
+    os.environ['GITHUB_API_BASE'] = f'http://127.0.0.1:{args.porta}'
+    os.environ['GITHUB_RAW_BASE'] = f'http://127.0.0.1:{args.porta}'
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    logging.getLogger('mapa_fotos').setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.GITHUB_REPO = REPO_FALSO
+    app.CACHE_FILE = os.path.join(trabalho, 'fotos_cache.json')
+    app.RESUMO_FILE = os.path.join(trabalho, 'fotos_cache_resumo.json')
+
+    resultados = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_atual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parametros': vars(args),
+        'tamanhos': {}
+    }
+
+    print('=' * 60)
+    print('⏱️  BENCHMARK - MAPA DE FOTOS')
+    print('=' * 60)
+    print(f'📁 Dados temporários: {trabalho}')
+
+    try:
+        for tamanho in tamanhos:
+            print(f'\n📸 {tamanho} fotos')
+            resultado = {}
+            pasta = os.path.join(trabalho, f'dados_{tamanho}')
+            thumbs = os.path.join(trabalho, f'thumbnails_{tamanho}')
+            os.makedirs(thumbs, exist_ok=True)
+            app.THUMBNAIL_FOLDER = thumbs
+
+            precisa_arquivos = etapas & {'exif', 'thumbnail', 'kml', 'gpx', 'ingestao'}
+            arquivos = []
+            if precisa_arquivos:
+                inicio = time.perf_counter()
+                arquivos = gerar_conjunto(pasta, tamanho, args.pontos_trajeto, args.sem_gps,
+                                          args.seed, app.FUSO_HORARIO_CAMERA)
+                print(f'  🧪 Conjunto gerado em {time.perf_counter() - inicio:.1f}s')
+
+            if 'exif' in etapas:
+                resultado['exif'] = bench_exif(app, pasta, arquivos, args.amostra)
+                print(f"  🔎 exif: p50 {resultado['exif']['p50_ms']} ms")
+            if 'thumbnail' in etapas:
+                resultado['thumbnail'] = bench_thumbnail(app, pasta, arquivos, args.amostra, thumbs)
+                print(f"  🖼️  thumbnail: p50 {resultado['thumbnail']['p50_ms']} ms")
+            if 'kml' in etapas:
+                resultado['kml'] = bench_trajeto(app, pasta, 'trajeto.kml', app.extrair_trajetos_kml)
+                print(f"  🗺️  kml: {resultado['kml']['pontos_por_s']} pontos/s")
+            if 'gpx' in etapas:
+                resultado['gpx'] = bench_trajeto(app, pasta, 'trajeto.gpx', app.extrair_trajetos_gpx)
+                print(f"  🗺️  gpx: {resultado['gpx']['pontos_por_s']} pontos/s")
+            if 'geotag' in etapas:
+                resultado['geotag'] = bench_geotag(app, args.pontos_trajeto, tamanho, args.seed)
+                print(f"  🕒 geotag: {resultado['geotag']['fotos_por_s']} fotos/s")
+            if 'duplicatas' in etapas:
+                resultado['duplicatas'] = bench_duplicatas(app, tamanho, args.seed)
+                print(f"  📚 duplicatas: {resultado['duplicatas']['fotos_por_s']} fotos/s")
+            if 'ingestao' in etapas and tamanho <= args.max_ingestao:
+                servidor = iniciar_servidor(pasta, args.porta)
+                try:
+                    resultado['ingestao'] = bench_ingestao(app, len(arquivos))
+                finally:
+                    servidor.terminate()
+                print(f"  🔄 ingestão: {resultado['ingestao']['arquivos_por_s']} arquivos/s")
+            if 'api' in etapas:
+                registros = gerar_cache_sintetico(app, tamanho, args.seed)
+                print(f'  🧪 Cache sintético: {tamanho} fotos em {registros} registros (com variantes)')
+                rotas = ['/api/fotos', '/api/kml', '/api/all', '/api/status', '/healthz']
+                modos = ('wsgi', 'asgi') if args.modo == 'ambos' else (args.modo,)
+                for modo in modos:
+                    # 'api' é o Flask (como nas versões anteriores), 'api_asgi' o Starlette
+                    chave = 'api' if modo == 'wsgi' else f'api_{modo}'
+                    resultado[chave] = bench_api(app, rotas, args.requisicoes, args.concorrencia,
+                                                 args.porta + 1, modo)
+                    for rota, medida in resultado[chave].items():
+                        print(f"  📡 [{modo}] {rota}: p50 {medida['p50_ms']} ms, p99 {medida['p99_ms']} ms, "
+                              f"{medida['requisicoes_por_s']} req/s")
+
+            resultados['tamanhos'][str(tamanho)] = resultado
+            if not args.manter:
+                shutil.rmtree(pasta, ignore_errors=True)
+                shutil.rmtree(thumbs, ignore_errors=True)
+    finally:
+        if not args.manter:
+            shutil.rmtree(trabalho, ignore_errors=True)
+
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    print(f'\n✅ Resultados salvos em {args.saida}')
+
+
+if __name__ == '__main__':
+    main()
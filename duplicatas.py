@@ -0,0 +1,136 @@
+"""
+Detecção de fotos duplicadas e quase duplicadas (ex: fotos em rajada).
+
+Cada foto recebe um dHash de 64 bits calculado a partir da thumbnail já
+decodificada. Uma árvore BK encontra os hashes próximos (distância de
+Hamming) e só são agrupadas fotos tiradas perto uma da outra, no espaço e
+no tempo.
+"""
+
+from math import asin, cos, radians, sin, sqrt
+
+from PIL import Image
+
+RAIO_TERRA_METROS = 6371000
+
+
+def calcular_dhash(img, tamanho=8):
+    """dHash: compara cada pixel com o vizinho da direita numa miniatura em cinza"""
+    cinza = img.convert('L').resize((tamanho + 1, tamanho), Image.Resampling.BILINEAR)
+    pixels = list(cinza.getdata())
+    valor = 0
+    for linha in range(tamanho):
+        inicio = linha * (tamanho + 1)
+        for coluna in range(tamanho):
+            valor = (valor << 1) | (pixels[inicio + coluna] > pixels[inicio + coluna + 1])
+    return valor
+
+
+def distancia_hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def distancia_metros(lat1, lon1, lat2, lon2):
+    """Distância (haversine) entre dois pontos em metros"""
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_METROS * asin(sqrt(a))
+
+
+class ArvoreBK:
+    """Árvore BK sobre a distância de Hamming, para buscas por raio"""
+
+    def __init__(self):
+        self.raiz = None
+
+    def inserir(self, valor, item):
+        no = (valor, item, {})
+        if self.raiz is None:
+            self.raiz = no
+            return
+
+        atual = self.raiz
+        while True:
+            distancia = distancia_hamming(valor, atual[0])
+            filho = atual[2].get(distancia)
+            if filho is None:
+                atual[2][distancia] = no
+                return
+            atual = filho
+
+    def buscar(self, valor, raio):
+        """Itens cujo hash está a até `raio` bits de `valor`"""
+        encontrados = []
+        pendentes = [self.raiz] if self.raiz is not None else []
+        while pendentes:
+            hash_no, item, filhos = pendentes.pop()
+            distancia = distancia_hamming(valor, hash_no)
+            if distancia <= raio:
+                encontrados.append(item)
+            for distancia_filho, filho in filhos.items():
+                if distancia - raio <= distancia_filho <= distancia + raio:
+                    pendentes.append(filho)
+        return encontrados
+
+
+def agrupar_duplicatas(fotos, max_distancia_hash, janela_segundos, raio_metros):
+    """Agrupa fotos com hash parecido tiradas na mesma janela de tempo e raio
+
+    `fotos` são registros com 'dhash' (hex), 'timestamp', 'latitude' e
+    'longitude'. Retorna listas de índices de `fotos`, na ordem original;
+    fotos sem grupo aparecem sozinhas.
+
+    Cada grupo cobre no máximo `janela_segundos` do início ao fim e fica a
+    até `raio_metros` da sua primeira foto: uma sequência de fotos iguais
+    tiradas a cada minuto não vira um grupo só.
+    """
+    # Grupo de cada foto: {'indices', 'ancora'} (âncora: índice da primeira foto)
+    grupo_de = [None] * len(fotos)
+
+    # Uma árvore por faixa de tempo de largura `janela_segundos`: fotos dentro
+    # da janela estão sempre na mesma faixa ou na vizinha, e as árvores ficam
+    # pequenas (uma única árvore com raio grande visitaria quase todos os nós)
+    arvores = {}
+    largura = max(janela_segundos, 1)
+    validas = [i for i, foto in enumerate(fotos)
+               if foto.get('dhash') is not None and foto.get('timestamp') is not None]
+    # Em ordem de horário, a âncora de cada grupo é a foto mais antiga
+    validas.sort(key=lambda i: fotos[i]['timestamp'])
+
+    for i in validas:
+        foto = fotos[i]
+        valor = int(foto['dhash'], 16)
+        faixa = int(foto['timestamp'] // largura)
+
+        melhor = None
+        for vizinha in (faixa - 1, faixa):
+            arvore = arvores.get(vizinha)
+            if arvore is None:
+                continue
+            for j in arvore.buscar(valor, max_distancia_hash):
+                grupo = grupo_de[j]
+                ancora = fotos[grupo['ancora']]
+                if foto['timestamp'] - ancora['timestamp'] > janela_segundos:
+                    continue
+                if distancia_metros(foto['latitude'], foto['longitude'],
+                                    ancora['latitude'], ancora['longitude']) > raio_metros:
+                    continue
+                distancia = distancia_hamming(valor, int(fotos[j]['dhash'], 16))
+                if melhor is None or distancia < melhor[0]:
+                    melhor = (distancia, grupo)
+
+        if melhor is None:
+            grupo_de[i] = {'indices': [i], 'ancora': i}
+        else:
+            grupo_de[i] = melhor[1]
+            grupo_de[i]['indices'].append(i)
+
+        arvores.setdefault(faixa, ArvoreBK()).inserir(valor, i)
+
+    grupos = []
+    for i, grupo in enumerate(grupo_de):
+        if grupo is None:
+            grupos.append([i])
+        elif grupo['ancora'] == i:
+            grupos.append(sorted(grupo['indices']))
+    return sorted(grupos, key=lambda grupo: grupo[0])
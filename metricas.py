@@ -0,0 +1,176 @@
+"""
+Métricas no formato de texto do Prometheus e log estruturado das etapas.
+
+Implementação mínima, sem dependências externas: contadores, medidores e
+histogramas com rótulos, guardados em memória do processo (cada worker do
+gunicorn expõe as suas próprias métricas em /metrics).
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites (segundos) dos histogramas de duração
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+logger = logging.getLogger('mapa_fotos')
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _formatar_rotulos(rotulos):
+    """Formata rótulos como {chave="valor",...}"""
+    if not rotulos:
+        return ''
+    partes = []
+    for chave, valor in rotulos:
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{chave}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def _formatar_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class _Metrica:
+    tipo = ''
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def _chave(self, rotulos):
+        return tuple(sorted(rotulos.items()))
+
+    def cabecalho(self):
+        return [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}']
+
+
+class Contador(_Metrica):
+    """Valor que só cresce (ex: requisições, bytes baixados)"""
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        return self._valores.get(self._chave(rotulos), 0)
+
+    def exportar(self):
+        with self._lock:
+            itens = list(self._valores.items())
+        linhas = self.cabecalho()
+        for chave, valor in itens:
+            linhas.append(f'{self.nome}{_formatar_rotulos(chave)} {_formatar_numero(valor)}')
+        return linhas
+
+
+class Medidor(Contador):
+    """Valor que sobe e desce (ex: tamanho do diretório de thumbnails)"""
+    tipo = 'gauge'
+
+    def set(self, valor, **rotulos):
+        with self._lock:
+            self._valores[self._chave(rotulos)] = valor
+
+
+class Histograma(_Metrica):
+    """Distribuição de durações em buckets cumulativos"""
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, buckets=BUCKETS_PADRAO):
+        super().__init__(nome, ajuda)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            estado = self._valores.get(chave)
+            if estado is None:
+                estado = self._valores[chave] = {'buckets': [0] * len(self.buckets), 'soma': 0.0, 'total': 0}
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    estado['buckets'][i] += 1
+                    break
+            estado['soma'] += valor
+            estado['total'] += 1
+
+    def exportar(self):
+        with self._lock:
+            itens = [(chave, dict(estado, buckets=list(estado['buckets'])))
+                     for chave, estado in self._valores.items()]
+        linhas = self.cabecalho()
+        for chave, estado in itens:
+            acumulado = 0
+            for limite, quantidade in zip(self.buckets, estado['buckets']):
+                acumulado += quantidade
+                rotulos = _formatar_rotulos(chave + (('le', _formatar_numero(limite)),))
+                linhas.append(f'{self.nome}_bucket{rotulos} {acumulado}')
+            rotulos = _formatar_rotulos(chave)
+            linhas.append(f'{self.nome}_sum{rotulos} {_formatar_numero(estado["soma"])}')
+            linhas.append(f'{self.nome}_count{rotulos} {estado["total"]}')
+        return linhas
+
+
+class Registro:
+    """Conjunto de métricas exportadas juntas em /metrics"""
+
+    def __init__(self):
+        self._metricas = []
+
+    def _registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, ajuda):
+        return self._registrar(Contador(nome, ajuda))
+
+    def medidor(self, nome, ajuda):
+        return self._registrar(Medidor(nome, ajuda))
+
+    def histograma(self, nome, ajuda, buckets=BUCKETS_PADRAO):
+        return self._registrar(Histograma(nome, ajuda, buckets))
+
+    def exportar(self):
+        linhas = []
+        for metrica in self._metricas:
+            linhas.extend(metrica.exportar())
+        return '\n'.join(linhas) + '\n'
+
+
+def registrar_evento(evento, **campos):
+    """Emite uma linha de log JSON (fácil de filtrar nos logs do Render)"""
+    campos = {'evento': evento, 'ts': round(time.time(), 3), **campos}
+    logger.info(json.dumps(campos, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def medir_etapa(histograma, etapa, **campos):
+    """Mede a duração de uma etapa, observa no histograma e registra no log"""
+    inicio = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except Exception:
+        status = 'erro'
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        histograma.observar(duracao, etapa=etapa)
+        registrar_evento('etapa', etapa=etapa, status=status,
+                         duracao_ms=round(duracao * 1000, 2), **campos)
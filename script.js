@@ -223,6 +223,17 @@ class MapaFotos {
                          onerror="this.src='https://via.placeholder.com/150x150?text=Erro+carregar'">
                     <div style="font-weight: bold; margin: 5px 0;">${foto.filename}</div>
                     <div style="font-size: 12px; color: #666;">${foto.data_tirada || 'Data não disponível'}</div>
+                    ${foto.variantes && foto.variantes.length
+                        ? `<div style="font-size: 12px; color: #666;">📚 +${foto.variantes.length} foto(s) semelhante(s)</div>
+                           <div style="display: flex; flex-wrap: wrap; gap: 4px; justify-content: center; margin-top: 5px;">
+                               ${foto.variantes.map(variante => `
+                                   <img src="${variante.thumbnail ? this.baseURL + variante.thumbnail : variante.placeholder}"
+                                        title="${variante.filename}"
+                                        style="width: 48px; height: 48px; object-fit: cover; border-radius: 3px; cursor: pointer;"
+                                        onclick="window.mapaFotos.mostrarFotoGrande('${variante.filename}')">
+                               `).join('')}
+                           </div>`
+                        : ''}
                     <button onclick="window.mapaFotos.mostrarFotoDetalhada('${foto.filename}')"
                             style="background: #3498db; color: white; border: none; padding: 8px 15px; border-radius: 4px; cursor: pointer; margin-top: 10px; width: 100%;">
                         Ver Foto
@@ -378,19 +389,34 @@ class MapaFotos {
         }
         
         if (nomeArquivo) nomeArquivo.textContent = foto.filename;
-        if (coordenadas) coordenadas.textContent = `${foto.latitude.toFixed(6)}, ${foto.longitude.toFixed(6)}`;
+        if (coordenadas) {
+            coordenadas.textContent = `${foto.latitude.toFixed(6)}, ${foto.longitude.toFixed(6)}`
+                + (foto.posicao_interpolada ? ' (interpolada pelo trajeto)' : '');
+        }
         if (data) data.textContent = foto.data_tirada || 'Data não disponível';
         
         // Destacar na lista
         this.highlightListItem(foto.filename);
     }
     
+    buscarFoto(nomeArquivo) {
+        // Foto principal ou uma das variantes (fotos semelhantes agrupadas)
+        for (const foto of this.fotos) {
+            if (foto.filename === nomeArquivo) return foto;
+            const variante = (foto.variantes || []).find(v => v.filename === nomeArquivo);
+            if (variante) return variante;
+        }
+        return null;
+    }
+    
     mostrarFotoGrande(nomeArquivo) {
-        const foto = this.fotos.find(f => f.filename === nomeArquivo);
+        const foto = this.buscarFoto(nomeArquivo);
         if (!foto) return;
         
-        // URL da imagem original
-        const imageUrl = foto.full_image || foto.original_url;
+        // URL da versão display (servida pelo backend) ou da imagem original
+        const imageUrl = foto.full_image && foto.full_image.startsWith('/')
+            ? `${this.baseURL}${foto.full_image}`
+            : (foto.full_image || foto.original_url);
         
         // Criar modal se não existir
         if (!document.getElementById('modal-foto')) {
@@ -417,12 +443,39 @@ class MapaFotos {
         const modal = document.getElementById('modal-foto');
         const modalImg = document.getElementById('modal-img');
         
-        modalImg.src = imageUrl;
         modalImg.alt = foto.filename;
         modal.style.display = 'block';
         
+        // Mostrar o placeholder borrado na hora e trocar quando a foto carregar
+        if (foto.placeholder) {
+            modalImg.src = foto.placeholder;
+            modalImg.style.width = '90vw';
+            modalImg.style.objectFit = 'contain';
+            modalImg.style.filter = 'blur(12px)';
+        } else {
+            modalImg.removeAttribute('src');
+        }
+        
+        const imagem = new Image();
+        imagem.onload = () => {
+            // Ignorar se o usuário já abriu outra foto
+            if (modalImg.alt !== foto.filename) return;
+            modalImg.src = imageUrl;
+            modalImg.style.width = '';
+            modalImg.style.filter = '';
+        };
+        imagem.onerror = () => {
+            if (modalImg.alt !== foto.filename) return;
+            // Versão display indisponível (foto grande demais, erro no GitHub): usar o original
+            modalImg.src = foto.original_url || `${this.baseURL}${foto.full_image}/original`;
+            modalImg.style.width = '';
+            modalImg.style.filter = '';
+        };
+        imagem.src = imageUrl;
+        
         // Destacar marcador
-        const marker = this.markers.find(m => m.fotoData.filename === nomeArquivo);
+        const marker = this.markers.find(m => m.fotoData.filename === nomeArquivo
+            || (m.fotoData.variantes || []).some(v => v.filename === nomeArquivo));
         if (marker) {
             this.destacarMarcador(marker);
         }
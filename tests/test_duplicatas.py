@@ -0,0 +1,52 @@
+"""Testes do agrupamento de quase duplicatas (python -m pytest tests)"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from duplicatas import agrupar_duplicatas, distancia_metros
+
+JANELA = 120
+RAIO = 50
+MAX_BITS = 10
+
+
+def foto(timestamp, dhash='f0f0f0f0f0f0f0f0', latitude=-23.55, longitude=-46.63):
+    return {'dhash': dhash, 'timestamp': timestamp, 'latitude': latitude, 'longitude': longitude}
+
+
+def test_rajada_vira_um_grupo():
+    fotos = [foto(1000 + i) for i in range(5)]
+    assert agrupar_duplicatas(fotos, MAX_BITS, JANELA, RAIO) == [[0, 1, 2, 3, 4]]
+
+
+def test_fotos_iguais_espacadas_nao_encadeiam():
+    # 60 fotos idênticas a cada 100 s: vizinhas estão dentro da janela, mas
+    # o grupo não pode crescer além de JANELA segundos
+    fotos = [foto(100 * i) for i in range(60)]
+    grupos = agrupar_duplicatas(fotos, MAX_BITS, JANELA, RAIO)
+
+    assert len(grupos) > 1
+    assert sorted(i for grupo in grupos for i in grupo) == list(range(60))
+    for grupo in grupos:
+        tempos = [fotos[i]['timestamp'] for i in grupo]
+        assert max(tempos) - min(tempos) <= JANELA
+
+
+def test_fotos_iguais_em_caminhada_nao_encadeiam():
+    # Mesma cena a cada 30 m em poucos segundos: o grupo fica no raio da primeira foto
+    fotos = [foto(1000 + i, latitude=-23.55 + i * 0.00027) for i in range(20)]
+    grupos = agrupar_duplicatas(fotos, MAX_BITS, JANELA, RAIO)
+
+    assert len(grupos) > 1
+    for grupo in grupos:
+        primeira = fotos[grupo[0]]
+        for i in grupo:
+            assert distancia_metros(primeira['latitude'], primeira['longitude'],
+                                    fotos[i]['latitude'], fotos[i]['longitude']) <= RAIO
+
+
+def test_hash_diferente_ou_sem_dados_fica_sozinha():
+    fotos = [foto(1000), foto(1001, dhash='0f0f0f0f0f0f0f0f'), foto(1002, dhash=None), foto(None)]
+    assert agrupar_duplicatas(fotos, MAX_BITS, JANELA, RAIO) == [[0], [1], [2], [3]]